@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+
+import os
+import json
+import random
+import sqlite3
+import hashlib
+import typer
+from loguru import logger
+
+AICHAT_KEY = 'workbench.panel.aichat.view.aichat.chatdata'
+USER_VARIANTS = ('text', 'delegate', 'initText', 'rawText')
+MODEL_TYPES = ('gpt-4', 'gpt-4o', 'claude-3.5-sonnet', 'cursor-small')
+WORDS = (
+    "the", "function", "returns", "a", "list", "of", "values", "why", "does", "this", "raise",
+    "error", "when", "I", "call", "it", "with", "matplotlib", "numpy", "array", "dataframe",
+    "should", "we", "use", "async", "await", "instead", "database", "query", "index", "cache",
+)
+
+def _text(rng: random.Random, size: int) -> str:
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return " ".join(words)[:size]
+
+def _user_bubble(rng: random.Random, text: str, variant: str, image_path: str | None) -> dict:
+    bubble = {"type": "user", "id": f"{rng.getrandbits(64):016x}", "selections": []}
+    if variant == 'text':
+        bubble["text"] = text
+    elif variant == 'delegate':
+        bubble["delegate"] = {"a": text}
+    elif variant == 'initText':
+        lexical = {"root": {"children": [{"children": [{"text": text, "type": "text"}], "type": "paragraph"}], "type": "root"}}
+        bubble["initText"] = json.dumps(lexical)
+    else:
+        bubble["rawText"] = text
+    if rng.random() < 0.2:
+        bubble["selections"] = [{"text": _text(rng, 80)}]
+    if image_path is not None:
+        bubble["image"] = {"path": image_path}
+    return bubble
+
+def _ai_bubble(rng: random.Random, text: str) -> dict:
+    # A code block with a file path exercises the formatter's rawText rewrite
+    code = f"```python:src/module_{rng.randint(0, 99)}.py\nprint({rng.randint(0, 999)})\n```"
+    return {
+        "type": "ai",
+        "id": f"{rng.getrandbits(64):016x}",
+        "rawText": f"{text}\n\n{code}\n",
+        "modelType": rng.choice(MODEL_TYPES),
+        "codeBlocks": [],
+    }
+
+def generate_chat_data(
+    rng: random.Random,
+    tabs: int,
+    bubbles: int,
+    text_size: int,
+    variants: tuple[str, ...] = USER_VARIANTS,
+    image_paths: list[str] | None = None,
+    image_ratio: float = 0.0,
+) -> dict:
+    """Generate the chatdata value of one workspace.
+
+    Args:
+        rng (random.Random): The random generator.
+        tabs (int): The number of tabs.
+        bubbles (int): The number of bubbles per tab, alternating between user and AI.
+        text_size (int): The number of characters of each bubble's text.
+        variants (tuple[str, ...]): The fields user bubbles keep their text in, used in turn.
+        image_paths (list[str] | None): Images user bubbles may reference.
+        image_ratio (float): The share of user bubbles referencing an image.
+
+    Returns:
+        dict: The chat data, as stored JSON-encoded in the database.
+    """
+    chat_tabs = []
+    for tab_index in range(tabs):
+        tab_bubbles = []
+        for bubble_index in range(bubbles):
+            text = _text(rng, text_size)
+            if bubble_index % 2 == 0:
+                variant = variants[(bubble_index // 2) % len(variants)]
+                image_path = rng.choice(image_paths) if image_paths and rng.random() < image_ratio else None
+                tab_bubbles.append(_user_bubble(rng, text, variant, image_path))
+            else:
+                tab_bubbles.append(_ai_bubble(rng, text))
+        chat_tabs.append({
+            "tabId": f"{rng.getrandbits(64):016x}",
+            "chatTitle": _text(rng, 30),
+            "timestamp": 1700000000000 + tab_index * 60000,
+            "bubbles": tab_bubbles,
+        })
+    return {"tabs": chat_tabs, "selectedTabId": chat_tabs[-1]["tabId"] if chat_tabs else None}
+
+def write_state_db(db_path: str, chat_data: dict) -> None:
+    """Write a state.vscdb file holding the chat data and a few unrelated keys, like Cursor does."""
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE ItemTable (key TEXT UNIQUE ON CONFLICT REPLACE, value BLOB)")
+    conn.executemany(
+        "INSERT INTO ItemTable (key, value) VALUES (?, ?)",
+        [
+            (AICHAT_KEY, json.dumps(chat_data)),
+            ('workbench.explorer.treeViewState', json.dumps({"expanded": ["src", "tests"]})),
+            ('memento/workbench.editors.files.textFileEditor', json.dumps({"mementos": {}})),
+        ],
+    )
+    conn.commit()
+    conn.close()
+
+def generate_workspaces(
+    root: str,
+    workspaces: int = 10,
+    tabs: int = 5,
+    bubbles: int = 20,
+    text_size: int = 500,
+    images: int = 0,
+    image_ratio: float = 0.1,
+    variants: tuple[str, ...] = USER_VARIANTS,
+    seed: int = 0,
+) -> list[str]:
+    """Generate a synthetic workspaceStorage tree.
+
+    Every workspace gets a folder named after a hash, like Cursor does, holding a state.vscdb and a
+    workspace.json. The modification times increase with the workspace number.
+
+    Args:
+        root (str): The directory to generate the workspaces in.
+        workspaces (int): The number of workspaces.
+        tabs (int): The number of tabs per workspace.
+        bubbles (int): The number of bubbles per tab.
+        text_size (int): The number of characters of each bubble's text.
+        images (int): The number of distinct image files to generate and reference.
+        image_ratio (float): The share of user bubbles referencing an image.
+        variants (tuple[str, ...]): The fields user bubbles keep their text in, used in turn.
+        seed (int): The seed of the random generator.
+
+    Returns:
+        list[str]: The paths to the generated state.vscdb files.
+    """
+    rng = random.Random(seed)
+    os.makedirs(root, exist_ok=True)
+
+    image_paths = []
+    if images:
+        image_root = os.path.join(root, '_images')
+        os.makedirs(image_root, exist_ok=True)
+        for image_index in range(images):
+            image_path = os.path.join(image_root, f"screenshot_{image_index}.png")
+            with open(image_path, 'wb') as file:
+                file.write(rng.randbytes(64 * 1024))
+            image_paths.append(image_path)
+
+    db_paths = []
+    for workspace_index in range(workspaces):
+        folder = hashlib.md5(f"{seed}-{workspace_index}".encode()).hexdigest()
+        workspace_dir = os.path.join(root, folder)
+        os.makedirs(workspace_dir, exist_ok=True)
+        with open(os.path.join(workspace_dir, 'workspace.json'), 'w') as file:
+            json.dump({"folder": f"file:///home/user/projects/project-{workspace_index}"}, file)
+
+        chat_data = generate_chat_data(rng, tabs, bubbles, text_size, variants, image_paths, image_ratio if images else 0.0)
+        db_path = os.path.join(workspace_dir, 'state.vscdb')
+        write_state_db(db_path, chat_data)
+        mtime = 1700000000 + workspace_index * 60
+        os.utime(db_path, (mtime, mtime))
+        os.utime(workspace_dir, (mtime, mtime))
+        db_paths.append(db_path)
+
+    logger.info(f"Generated {workspaces} workspaces in {root}")
+    return db_paths
+
+def main(
+    root: str = typer.Argument(..., help="The directory to generate the workspaces in."),
+    workspaces: int = typer.Option(10, help="The number of workspaces."),
+    tabs: int = typer.Option(5, help="The number of tabs per workspace."),
+    bubbles: int = typer.Option(20, help="The number of bubbles per tab."),
+    text_size: int = typer.Option(500, help="The number of characters of each bubble's text."),
+    images: int = typer.Option(0, help="The number of distinct image files to generate and reference."),
+    image_ratio: float = typer.Option(0.1, help="The share of user bubbles referencing an image."),
+    variants: str = typer.Option(",".join(USER_VARIANTS), help="Comma-separated fields user bubbles keep their text in."),
+    seed: int = typer.Option(0, help="The seed of the random generator."),
+):
+    """
+    Generate synthetic Cursor workspaces with state.vscdb files.
+    """
+    variant_list = tuple(variant.strip() for variant in variants.split(','))
+    unknown = set(variant_list) - set(USER_VARIANTS)
+    if unknown:
+        logger.error(f"Unknown variants: {', '.join(sorted(unknown))}")
+        raise typer.Exit(code=1)
+    generate_workspaces(root, workspaces, tabs, bubbles, text_size, images, image_ratio, variant_list, seed)
+
+if __name__ == "__main__":
+    typer.run(main)
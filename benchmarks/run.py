@@ -0,0 +1,272 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import tempfile
+import tracemalloc
+import subprocess
+from datetime import datetime, timezone
+from typing import Any, Callable
+import typer
+from loguru import logger
+from rich.console import Console
+from rich.table import Table
+from benchmarks.generate import generate_workspaces
+from src.vscdb import VSCDBQuery
+from src.chatdata import iter_tabs
+from src.export import ChatExporter, MarkdownChatFormatter, MarkdownFileSaver
+from src.discover import discover_dbs
+
+console = Console()
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CHAT_PY = os.path.join(REPO_ROOT, 'chat.py')
+
+# name: (workspaces, tabs, bubbles, text_size, images)
+SCALES = {
+    "small": (5, 3, 10, 200, 0),
+    "medium": (20, 10, 40, 1000, 5),
+    "large": (50, 20, 100, 2000, 20),
+}
+
+def measure(stage: str, scale: str, function: Callable[[], Any], items: int = 0, size: int = 0, repeat: int = 3) -> dict[str, Any]:
+    """Run a benchmark stage and return its best wall time and its peak traced memory.
+
+    Args:
+        stage (str): The name of the stage.
+        scale (str): The name of the scale.
+        function (Callable[[], Any]): The work to measure.
+        items (int): The number of items (bubbles, tabs, databases) processed per run.
+        size (int): The number of bytes processed per run.
+        repeat (int): The number of timed runs. The fastest one is reported.
+
+    Returns:
+        dict[str, Any]: The result record.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+
+    # Tracing slows things down, so memory is measured on a separate run
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    seconds = min(timings)
+    return {
+        "scale": scale,
+        "stage": stage,
+        "seconds": seconds,
+        "items": items,
+        "bytes": size,
+        "items_per_second": items / seconds if seconds and items else None,
+        "mb_per_second": size / seconds / 1e6 if seconds and size else None,
+        "peak_memory_bytes": peak,
+    }
+
+def measure_command(stage: str, scale: str, args: list[str], repeat: int = 3) -> dict[str, Any]:
+    """Run the CLI in a fresh interpreter and return its best wall time and peak resident memory.
+
+    This measures the cold start of a command as a shell script sees it, imports included.
+
+    Args:
+        stage (str): The name of the stage.
+        scale (str): The name of the scale.
+        args (list[str]): The arguments passed to chat.py.
+        repeat (int): The number of timed runs. The fastest one is reported.
+
+    Returns:
+        dict[str, Any]: The result record.
+    """
+    timings = []
+    peak = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        process = subprocess.Popen([sys.executable, CHAT_PY, *args], cwd=REPO_ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        if hasattr(os, 'wait4'):
+            # The resource usage of this very child, in kilobytes on Linux and bytes on macOS
+            _, status, usage = os.wait4(process.pid, 0)
+            process.returncode = os.waitstatus_to_exitcode(status)
+            peak = usage.ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+        else:
+            process.wait()
+        timings.append(time.perf_counter() - start)
+
+    seconds = min(timings)
+    return {
+        "scale": scale,
+        "stage": stage,
+        "seconds": seconds,
+        "items": 1,
+        "bytes": 0,
+        "items_per_second": 1 / seconds if seconds else None,
+        "mb_per_second": None,
+        "peak_memory_bytes": peak,
+    }
+
+def run_scale(scale: str, root: str, repeat: int) -> list[dict[str, Any]]:
+    workspaces, tabs, bubbles, text_size, images = SCALES[scale]
+    db_paths = generate_workspaces(os.path.join(root, scale), workspaces, tabs, bubbles, text_size, images)
+    total_bubbles = workspaces * tabs * bubbles
+
+    raw_values = [VSCDBQuery(db_path).query_aichat_data()[0] for db_path in db_paths]
+    raw_bytes = sum(len(raw_value) for raw_value in raw_values)
+    decoded = [json.loads(raw_value) for raw_value in raw_values]
+    formatter = MarkdownChatFormatter()
+    formatted = [formatter.format(chat_data, image_dir=None) for chat_data in decoded]
+    formatted_bytes = sum(len(text) for chats in formatted for text in chats.values())
+    output_dir = os.path.join(root, f"{scale}_output")
+
+    def query() -> None:
+        for db_path in db_paths:
+            VSCDBQuery(db_path).query_aichat_data()
+
+    def decode() -> None:
+        for raw_value in raw_values:
+            json.loads(raw_value)
+
+    def decode_streaming() -> None:
+        for raw_value in raw_values:
+            for _ in iter_tabs(raw_value):
+                pass
+
+    def format_() -> None:
+        for chat_data in decoded:
+            MarkdownChatFormatter().format(chat_data, image_dir=None)
+
+    def save() -> None:
+        saver = MarkdownFileSaver()
+        shutil.rmtree(output_dir, ignore_errors=True)
+        for workspace_index, chats in enumerate(formatted):
+            workspace_dir = os.path.join(output_dir, str(workspace_index))
+            os.makedirs(workspace_dir, exist_ok=True)
+            for tab_name, text in chats.items():
+                saver.save(text, os.path.join(workspace_dir, f"{tab_name}.md"))
+
+    def export() -> None:
+        shutil.rmtree(output_dir, ignore_errors=True)
+        for workspace_index, raw_value in enumerate(raw_values):
+            workspace_dir = os.path.join(output_dir, str(workspace_index))
+            exporter = ChatExporter(MarkdownChatFormatter(), MarkdownFileSaver())
+            exporter.export(iter_tabs(raw_value), workspace_dir, os.path.join(workspace_dir, 'images'))
+
+    def discover() -> None:
+        for _ in discover_dbs(db_paths):
+            pass
+
+    def discover_search() -> None:
+        for _ in discover_dbs(db_paths, search_text="matplotlib"):
+            pass
+
+    stages = [
+        ("query", query, len(db_paths), raw_bytes),
+        ("decode", decode, total_bubbles, raw_bytes),
+        ("decode_streaming", decode_streaming, total_bubbles, raw_bytes),
+        ("format", format_, total_bubbles, formatted_bytes),
+        ("save", save, workspaces * tabs, formatted_bytes),
+        ("export", export, total_bubbles, raw_bytes),
+        ("discover", discover, len(db_paths), raw_bytes),
+        ("discover_search", discover_search, len(db_paths), raw_bytes),
+    ]
+    # Cold starts of the CLI on the latest database, as called from a shell script
+    latest_db_path = db_paths[-1]
+    commands = [
+        ("cli_export_latest_tab", ["export", "--latest-tab", latest_db_path]),
+        ("cli_export_latest_tab_output", ["export", "--latest-tab", "--force", "--output-dir", output_dir, latest_db_path]),
+    ]
+
+    results = []
+    for stage, function, items, size in stages:
+        results.append(measure(stage, scale, function, items, size, repeat))
+        report(results[-1])
+    for stage, args in commands:
+        results.append(measure_command(stage, scale, args, repeat))
+        report(results[-1])
+    shutil.rmtree(output_dir, ignore_errors=True)
+    return results
+
+def report(result: dict[str, Any]) -> None:
+    peak = result['peak_memory_bytes']
+    peak_text = f"{peak / 1e6:10.1f} MB peak" if peak is not None else ""
+    console.print(f"{result['scale']:>8} {result['stage']:<28} {result['seconds'] * 1000:10.1f} ms {peak_text}")
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results: list[dict[str, Any]], baseline_path: str) -> None:
+    with open(baseline_path, 'r') as file:
+        baseline = {(r["scale"], r["stage"]): r for r in json.load(file)["results"]}
+
+    table = Table(title=f"Compared to {baseline_path}")
+    for column in ("scale", "stage", "time", "baseline", "speedup", "peak memory", "baseline"):
+        table.add_column(column, justify="left" if column in ("scale", "stage") else "right")
+    for result in results:
+        before = baseline.get((result["scale"], result["stage"]))
+        if before is None:
+            continue
+        table.add_row(
+            result["scale"],
+            result["stage"],
+            f"{result['seconds'] * 1000:.1f} ms",
+            f"{before['seconds'] * 1000:.1f} ms",
+            f"{before['seconds'] / result['seconds']:.2f}x",
+            f"{result['peak_memory_bytes'] / 1e6:.1f} MB" if result['peak_memory_bytes'] is not None else "-",
+            f"{before['peak_memory_bytes'] / 1e6:.1f} MB" if before['peak_memory_bytes'] is not None else "-",
+        )
+    console.print(table)
+
+def main(
+    scales: str = typer.Option("small,medium", help=f"Comma-separated scales to run, out of {', '.join(SCALES)}."),
+    output: str = typer.Option("bench_results.json", help="The JSON file the results are written to."),
+    baseline: str = typer.Option(None, help="A results file of an earlier run to compare against."),
+    repeat: int = typer.Option(3, help="The number of timed runs per stage. The fastest one is reported."),
+    workdir: str = typer.Option(None, help="The directory the synthetic workspaces are generated in. Defaults to a temporary directory."),
+):
+    """
+    Benchmark querying, decoding, formatting, saving and discovering chats, and the CLI cold start, on synthetic workspaces.
+    """
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    scale_list = [scale.strip() for scale in scales.split(',')]
+    unknown = set(scale_list) - set(SCALES)
+    if unknown:
+        logger.error(f"Unknown scales: {', '.join(sorted(unknown))}")
+        raise typer.Exit(code=1)
+
+    root = workdir or tempfile.mkdtemp(prefix="cursor-chat-bench-")
+    try:
+        results = []
+        for scale in scale_list:
+            results.extend(run_scale(scale, root, repeat))
+    finally:
+        if workdir is None:
+            shutil.rmtree(root, ignore_errors=True)
+
+    report = {
+        "created": datetime.now(timezone.utc).isoformat(),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "scales": {scale: dict(zip(("workspaces", "tabs", "bubbles", "text_size", "images"), SCALES[scale])) for scale in scale_list},
+        "results": results,
+    }
+    with open(output, 'w') as file:
+        json.dump(report, file, indent=2)
+    console.print(f"Results written to {output}")
+
+    if baseline:
+        compare(results, baseline)
+
+if __name__ == "__main__":
+    typer.run(main)
@@ -3,37 +3,94 @@
 import os
 import sys
 import typer
-from src.vscdb import VSCDBQuery
-from src.export import ChatExporter, MarkdownChatFormatter, MarkdownFileSaver
-from rich.console import Console
-from rich.markdown import Markdown
+from src.vscdb import VSCDBQuery, db_version
+from src.catalog import WorkspaceCatalog
+from src.chatdata import iter_tabs, latest_tab as find_latest_tab
+from src.config import load_config
+from src.profiling import Profiler, profile_stage
 from loguru import logger
 import json
-import yaml
 import platform
+from itertools import groupby
+from datetime import datetime
+from contextlib import nullcontext
 from pathlib import Path
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from rich.console import Console
+
+# rich, the formatters, the index and the worker pools are imported by the commands that use them,
+# so that a command starts without loading what it does not need.
 
 app = typer.Typer()
-console = Console()
+_console: "Console | None" = None
+
+def get_console() -> "Console":
+    global _console
+    if _console is None:
+        from rich.console import Console
+        _console = Console()
+    return _console
 
 @app.command()
 def export(
     db_path: str = typer.Argument(None, help="The path to the SQLite database file. If not provided, the latest workspace will be used."),
+    project: str = typer.Option(None, help="Export the most recent workspace of this project, given by its folder name or path, instead of the latest workspace."),
     output_dir: str = typer.Option(None, help="The directory where the output markdown files will be saved. If not provided, prints to command line."),
+    archive: str = typer.Option(None, help="Save the markdown files and images in a single .zip, .tar, .tar.gz, .tgz, .tar.bz2 or .tar.xz archive instead of a directory."),
+    compress: bool = typer.Option(False, "--compress", help="Compress a .zip or .tar archive. Other tar extensions are compressed anyway."),
     latest_tab: bool = typer.Option(False, "--latest-tab", help="Export only the latest tab. If not set, all tabs will be exported."),
-    tab_ids: str = typer.Option(None, help="Comma-separated list of tab IDs to export. For example, '1,2,3'. If not set, all tabs will be exported.")
+    tab_ids: str = typer.Option(None, help="Comma-separated list of tab IDs to export. For example, '1,2,3'. If not set, all tabs will be exported."),
+    force: bool = typer.Option(False, "--force", help="Format all selected tabs again, even if they did not change since the last export to the output directory."),
+    pager: bool = typer.Option(False, "--pager", help="Page the chats printed to the command line with $PAGER (less by default)."),
+    profile: bool = typer.Option(False, "--profile", help="Print the wall time and bytes of each stage."),
+    profile_memory: bool = typer.Option(False, "--profile-memory", help="Also trace the peak memory of each stage. Tracing slows the run down, so its wall times are not representative."),
+    profile_json: str = typer.Option(None, help="Write the per-stage and per-database profile to this JSON file.")
 ):
     """
     Export chat data from the database to markdown files or print it to the command line.
     """
+    if archive and output_dir:
+        logger.error("Use either --output-dir or --archive, not both")
+        raise typer.Exit(code=1)
+
     if not db_path:
-        db_path = get_latest_workspace_db_path()
+        try:
+            db_path = get_project_db_path(project) if project else get_latest_workspace_db_path()
+        except (FileNotFoundError, ValueError) as e:
+            logger.error(str(e))
+            raise typer.Exit(code=1)
+
+    profiler = Profiler(trace_memory=profile_memory) if profile or profile_memory or profile_json else None
+
+    try:
+        with profiler.database(db_path) if profiler is not None else nullcontext():
+            _export(db_path, output_dir, latest_tab, tab_ids, force, pager, profiler, archive, compress)
+    finally:
+        if profiler is not None:
+            report_profile(profiler, profile_json)
+
+def _export(db_path: str, output_dir: str | None, latest_tab: bool, tab_ids: str | None, force: bool, pager: bool, profiler: Profiler | None, archive: str | None = None, compress: bool = False) -> None:
+    from src.export import ArchiveFileSaver, ChatExporter, ExportManifest, MarkdownChatFormatter, MarkdownFileSaver
 
     image_dir = None
 
     try:
+        # Skip the database entirely if it did not change since it was last exported to the output directory
+        manifest = None
+        if output_dir:
+            manifest = ExportManifest(output_dir)
+            version = db_version(db_path)
+            selection = "latest" if latest_tab else tab_ids or "all"
+            if force:
+                manifest.tabs.clear()
+            elif manifest.is_current(db_path, version, selection):
+                get_console().print(f"Database unchanged since the last export: {len(manifest.tabs)} tabs skipped, 0 rewritten, 0 added.")
+                return
+
         # Query the AI chat data from the database
-        db_query = VSCDBQuery(db_path)
+        db_query = VSCDBQuery(db_path, profiler=profiler)
         chat_data = db_query.query_aichat_data()
 
         if "error" in chat_data:
@@ -41,40 +98,76 @@ def export(
             logger.error(error_message)
             raise typer.Exit(code=1)
 
-        # Convert the chat data from JSON string to dictionary
-        chat_data_dict = json.loads(chat_data[0])
+        if not chat_data:
+            logger.error(f"No chat data found in {db_path}")
+            raise typer.Exit(code=1)
 
+        # Decode the tabs one at a time, dropping the unwanted ones right away
         tab_id_list = None
         if latest_tab:
-            # Get the latest tab by timestamp
-            latest_tab = max(chat_data_dict['tabs'], key=lambda tab: tab.get('timestamp', 0))
-            chat_data_dict['tabs'] = [latest_tab]
+            # Get the latest tab by timestamp, exported as tab 1, reading the chat data only once
+            with profile_stage(profiler, "decode"):
+                latest = find_latest_tab(chat_data[0])
+            tabs = [(0, latest[1])] if latest is not None else []
         elif tab_ids:
             # Filter tabs by provided tab IDs
             tab_id_list = [int(ti) - 1 for ti in tab_ids.split(',')]
+            tabs = iter_tabs(chat_data[0], tab_ids=tab_id_list)
+        else:
+            tabs = iter_tabs(chat_data[0])
 
-        # Check if there are any images in the chat data
-        has_images = any('image' in bubble for tab in chat_data_dict['tabs'] for bubble in tab.get('bubbles', []))
-
-        if has_images and output_dir:
+        # Images are copied to a folder next to the tabs, which is only created if there are any
+        if output_dir:
             image_dir = os.path.join(output_dir, 'images')
 
         # Format the chat data
-        formatter = MarkdownChatFormatter()
+        if archive:
+            # Tabs sit at the root of the archive, images in its images folder. Archives are always written whole.
+            saver = ArchiveFileSaver(archive, compress=compress)
+            formatter = MarkdownChatFormatter(profiler=profiler, image_saver=saver)
+            exporter = ChatExporter(formatter, saver, profiler=profiler)
+            try:
+                stats = exporter.export(tabs, "", "images")
+            finally:
+                saver.close()
+            get_console().print(f"{stats['added']} tabs added to {archive}.")
+            if stats['failed']:
+                logger.error(f"Failed to add {stats['failed']} tabs to {archive}")
+                raise typer.Exit(code=1)
+            logger.info(f"Chat data has been successfully exported to {archive}")
+            return
+
+        formatter = MarkdownChatFormatter(profiler=profiler)
         if output_dir:
             # Save the chat data
             saver = MarkdownFileSaver()
-            exporter = ChatExporter(formatter, saver)
-            exporter.export(chat_data_dict, output_dir, image_dir, tab_ids=tab_id_list)
+            exporter = ChatExporter(formatter, saver, profiler=profiler)
+            stats = exporter.export(tabs, output_dir, image_dir, manifest=manifest)
+            # The database only counts as exported if every tab made it, else the next run would skip it
+            if not stats['failed']:
+                manifest.update_source(db_path, version, selection)
+            manifest.save()
+            get_console().print(f"{stats['skipped']} tabs skipped, {stats['rewritten']} rewritten, {stats['added']} added.")
+            if stats['failed']:
+                logger.error(f"Failed to export {stats['failed']} tabs to {output_dir}")
+                raise typer.Exit(code=1)
             success_message = f"Chat data has been successfully exported to {output_dir}"
             logger.info(success_message)
         else:
-            formatted_chats = formatter.format(chat_data_dict, image_dir, tab_ids=tab_id_list)
-            # Print the chat data to the command line using markdown
-            for formatted_data in formatted_chats:
-                console.print(Markdown(formatted_data))
+            if profiler is not None:
+                tabs = profiler.iterate("decode", tabs)
+            # Print the chat data to the command line using markdown, one bubble at a time.
+            # Scripts reading the output get the raw Markdown without loading the renderer.
+            from src.render import ConsoleRenderer, write_markdown
+            if sys.stdout.isatty():
+                renderer = ConsoleRenderer(get_console(), pager=pager, profiler=profiler)
+                renderer.render(formatter, tabs, image_dir)
+            else:
+                write_markdown(formatter, tabs, sys.stdout, image_dir, profiler=profiler)
             logger.info("Chat data has been successfully printed to the command line")
         
+    except typer.Exit:
+        raise
     except KeyError as e:
         error_message = f"KeyError: {e}. The chat data structure is not as expected. Please check the database content."
         logger.error(error_message)
@@ -92,18 +185,15 @@ def export(
         logger.error(error_message)
         raise typer.Exit(code=1)
 
-def get_cursor_workspace_path() -> Path:
-    config_path = Path("config.yml")
-    logger.debug(f"Looking for configuration file at: {config_path}")
-    
-    if not config_path.exists():
-        error_message = f"Configuration file not found: {config_path}"
-        logger.error(error_message)
-        raise FileNotFoundError(error_message)
+def report_profile(profiler: Profiler, profile_json: str | None = None) -> None:
+    profiler.stop()
+    get_console().print(profiler.summary_table())
+    if profile_json:
+        profiler.save_json(profile_json)
+        logger.info(f"Profile written to {profile_json}")
 
-    with open(config_path, 'r') as f:
-        config = yaml.safe_load(f)
-    logger.debug("Configuration file loaded successfully")
+def get_cursor_workspace_path() -> Path:
+    config = load_config()
 
     system = platform.system()
     logger.debug(f"Detected operating system: {system}")
@@ -125,85 +215,406 @@ def get_cursor_workspace_path() -> Path:
     return base_path
 
 def get_latest_workspace_db_path() -> str:
-    base_path = get_cursor_workspace_path()
-    workspace_folder = max(base_path.glob("*"), key=os.path.getmtime)
-    db_path = workspace_folder / "state.vscdb"
-    
-    if not db_path.exists():
-        raise FileNotFoundError(f"state.vscdb not found in {workspace_folder}")
+    catalog = get_workspace_catalog()
+    db_path = catalog.latest()
+
+    if db_path is None:
+        raise FileNotFoundError(f"No state.vscdb found in {catalog.storage_dir}")
+
+    return db_path
+
+def get_project_db_path(project: str) -> str:
+    matches = get_workspace_catalog().find_project(project)
 
-    return str(db_path)
+    if not matches:
+        raise FileNotFoundError(f"No workspace found for project: {project}")
+    if len(matches) > 1:
+        logger.info(f"{len(matches)} workspaces found for project {project}, using the most recent one")
+
+    return matches[0]['db_path']
+
+def get_workspace_catalog(storage_dir: str | None = None) -> WorkspaceCatalog:
+    config = load_config()
+    cache_dir = Path(os.path.expandvars(config["cache_dir"])).expanduser()
+    catalog = WorkspaceCatalog(str(cache_dir / "workspaces.json"), storage_dir or str(get_cursor_workspace_path()))
+    catalog.refresh()
+    return catalog
+
+def get_index_path() -> str:
+    config = load_config()
+    cache_dir = Path(os.path.expandvars(config["cache_dir"])).expanduser()
+    return str(cache_dir / "index.sqlite3")
+
+def get_state_files(directory: str | None) -> list[tuple[str, float]]:
+    """Find the state.vscdb files of a directory, or of the default workspace storage directory using the catalog, newest first."""
+    if not directory:
+        return get_workspace_catalog().state_files()
+    return find_state_files(directory)
+
+def find_state_files(directory: str) -> list[tuple[str, float]]:
+    """Find all state.vscdb files below a directory, newest first."""
+    state_files = []
+    for root, _, files in os.walk(directory):
+        if 'state.vscdb' in files:
+            db_path = os.path.join(root, 'state.vscdb')
+            # Derived from the nanoseconds like in the catalog, so the index sees the same time whichever way a file was found
+            state_files.append((db_path, os.stat(db_path).st_mtime_ns / 1e9))
+
+    # Sort files by modification time (newest first)
+    state_files.sort(key=lambda x: x[1], reverse=True)
+    return state_files
+
+@app.command()
+def index(
+    directory: str = typer.Argument(None, help="The directory to search for state.vscdb files. If not provided, the default Cursor workspace storage directory will be used."),
+    jobs: int = typer.Option(1, "--jobs", "-j", help="The number of worker processes used to read the changed databases."),
+    rebuild: bool = typer.Option(False, "--rebuild", help="Re-index every database, not only the ones that changed since the last run.")
+):
+    """
+    Build or refresh the full-text index used by `discover --search-text`.
+    """
+    from src.index import ChatIndex
+
+    try:
+        state_files = get_state_files(directory)
+        with ChatIndex(get_index_path()) as chat_index:
+            stats = chat_index.refresh(state_files, jobs=jobs, rebuild=rebuild)
+        get_console().print(
+            f"Indexed {stats['updated']} databases, {stats['unchanged']} unchanged, "
+            f"{stats['failed']} failed, {stats['removed']} removed."
+        )
+    except FileNotFoundError as e:
+        error_message = f"File not found: {e}"
+        logger.error(error_message)
+        raise typer.Exit(code=1)
+    except Exception as e:
+        error_message = f"Failed to index chat data: {e}"
+        logger.error(error_message)
+        raise typer.Exit(code=1)
+
+@app.command()
+def workspaces():
+    """
+    List the workspaces of the default Cursor workspace storage directory, most recently used first.
+    """
+    from rich.table import Table
+
+    try:
+        catalog = get_workspace_catalog()
+    except (FileNotFoundError, ValueError) as e:
+        logger.error(str(e))
+        raise typer.Exit(code=1)
+
+    table = Table()
+    for column in ("project", "tabs", "last used", "workspace", "path"):
+        table.add_column(column, justify="right" if column == "tabs" else "left", no_wrap=column != "path")
+    for folder, workspace in sorted(catalog.workspaces.items(), key=lambda item: item[1]['folder_mtime'], reverse=True):
+        project = workspace['project']
+        table.add_row(
+            os.path.basename(project.rstrip('/')) if project else "-",
+            str(workspace['tab_count']) if workspace['tab_count'] is not None else "-",
+            datetime.fromtimestamp(workspace['folder_mtime']).strftime("%Y-%m-%d %H:%M"),
+            folder,
+            project or "-",
+        )
+    get_console().print(table)
+
+@app.command("export-all")
+def export_all(
+    directory: str = typer.Argument(None, help="The directory to search for state.vscdb files. If not provided, the default Cursor workspace storage directory will be used."),
+    output: str = typer.Option(..., help="The JSON Lines file all chats are written to, one record per bubble."),
+    compress: bool = typer.Option(False, "--gzip", help="Compress the output with gzip. '.gz' is appended to the file name if missing."),
+    batch_size: int = typer.Option(1 << 20, help="The number of characters buffered before they are written to the file.")
+):
+    """
+    Export the chats of all workspaces into a single JSON Lines file.
+    """
+    from src.export import JsonlChatFormatter, JsonlFileSaver
+
+    if compress and not output.endswith('.gz'):
+        output += '.gz'
+
+    formatter = JsonlChatFormatter()
+    saver = JsonlFileSaver(compress=compress, batch_size=batch_size)
+    workspaces = 0
+    records = 0
+    failed = 0
+    closed = False
+    try:
+        for db_path, _ in get_state_files(directory):
+            chat_data = VSCDBQuery(db_path).query_aichat_data()
+            if "error" in chat_data:
+                logger.error(f"Error querying chat data from {db_path}: {chat_data['error']}")
+                continue
+            if not chat_data:
+                logger.debug(f"No chat data found in {db_path}")
+                continue
+
+            # Tabs are decoded, formatted and buffered one at a time to keep memory bounded
+            workspace = os.path.basename(os.path.dirname(db_path))
+            try:
+                for tab_index, tab in iter_tabs(chat_data[0]):
+                    formatted_chats = formatter.format([(tab_index, tab)], workspace=workspace) or {}
+                    for formatted_data in formatted_chats.values():
+                        if not saver.save(formatted_data, output):
+                            failed += 1
+                            continue
+                        records += formatted_data.count("\n")
+            except json.JSONDecodeError as e:
+                logger.error(f"JSON decode error in {db_path}: {e}")
+                continue
+            workspaces += 1
+    except FileNotFoundError as e:
+        error_message = f"File not found: {e}"
+        logger.error(error_message)
+        raise typer.Exit(code=1)
+    except Exception as e:
+        error_message = f"Failed to export chat data: {e}"
+        logger.error(error_message)
+        raise typer.Exit(code=1)
+    finally:
+        closed = saver.close()
+
+    get_console().print(f"Exported {records} bubbles from {workspaces} workspaces to {output}")
+    if failed or not closed:
+        logger.error(f"Failed to write {failed} tabs to {output}" if failed else f"Failed to finish writing {output}")
+        raise typer.Exit(code=1)
+
+@app.command("export-archive")
+def export_archive(
+    directory: str = typer.Argument(None, help="The directory to search for state.vscdb files. If not provided, the default Cursor workspace storage directory will be used."),
+    output: str = typer.Option(..., help="The .zip, .tar, .tar.gz, .tgz, .tar.bz2 or .tar.xz archive all chats and images are written to."),
+    compress: bool = typer.Option(False, "--compress", help="Compress a .zip or .tar archive. Other tar extensions are compressed anyway.")
+):
+    """
+    Export the chats and images of all workspaces into a single archive, with a table of contents.
+    """
+    from src.export import ArchiveFileSaver, ChatExporter, MarkdownChatFormatter
+
+    try:
+        saver = ArchiveFileSaver(output, compress=compress)
+    except (OSError, ValueError) as e:
+        logger.error(f"Failed to create archive: {e}")
+        raise typer.Exit(code=1)
+
+    formatter = MarkdownChatFormatter(image_saver=saver)
+    exporter = ChatExporter(formatter, saver)
+    workspaces = 0
+    tabs = 0
+    failed = 0
+    try:
+        for db_path, _ in get_state_files(directory):
+            chat_data = VSCDBQuery(db_path).query_aichat_data()
+            if "error" in chat_data:
+                logger.error(f"Error querying chat data from {db_path}: {chat_data['error']}")
+                continue
+            if not chat_data:
+                logger.debug(f"No chat data found in {db_path}")
+                continue
+
+            # One folder per workspace, named after its project where known so the table of contents is readable
+            prefix = WorkspaceCatalog.export_name(os.path.dirname(db_path))
+            try:
+                stats = exporter.export(iter_tabs(chat_data[0]), prefix, f"{prefix}/images")
+            except json.JSONDecodeError as e:
+                logger.error(f"JSON decode error in {db_path}: {e}")
+                continue
+            tabs += stats['added']
+            failed += stats['failed']
+            workspaces += 1
+    except FileNotFoundError as e:
+        error_message = f"File not found: {e}"
+        logger.error(error_message)
+        raise typer.Exit(code=1)
+    except Exception as e:
+        error_message = f"Failed to export chat data: {e}"
+        logger.error(error_message)
+        raise typer.Exit(code=1)
+    finally:
+        saver.close()
+
+    get_console().print(f"Exported {tabs} tabs from {workspaces} workspaces to {output}")
+    if failed:
+        logger.error(f"Failed to add {failed} tabs to {output}")
+        raise typer.Exit(code=1)
+
+@app.command()
+def watch(
+    directory: str = typer.Argument(None, help="The workspace storage directory to watch. If not provided, the default Cursor workspace storage directory will be used."),
+    output_dir: str = typer.Option(..., help="The directory each workspace is exported to, in a folder named after its project."),
+    debounce: float = typer.Option(2.0, help="The number of seconds without writes to wait for before exporting a workspace."),
+    max_delay: float = typer.Option(30.0, help="The maximum number of seconds an export is put off while writes keep coming."),
+    polling: bool = typer.Option(False, "--polling", help="Poll for changes instead of using inotify, e.g. on network file systems."),
+    poll_interval: float = typer.Option(5.0, help="The number of seconds between two scans when polling.")
+):
+    """
+    Export the chats of all workspaces, then keep exporting the tabs that change until interrupted.
+    """
+    from src.watch import ChatWatcher
+
+    try:
+        storage_dir = directory or str(get_cursor_workspace_path())
+    except FileNotFoundError as e:
+        logger.error(str(e))
+        raise typer.Exit(code=1)
+
+    get_console().print(f"Watching {storage_dir}, exporting to {output_dir}. Press Ctrl+C to stop.")
+    try:
+        ChatWatcher(storage_dir, output_dir, debounce=debounce, max_delay=max_delay, polling=polling, poll_interval=poll_interval).run()
+    except OSError as e:
+        logger.error(f"Failed to watch {storage_dir}: {e}")
+        raise typer.Exit(code=1)
+
+@app.command()
+def serve(
+    directory: str = typer.Argument(None, help="The workspace storage directory, holding one folder per workspace. If not provided, the default Cursor workspace storage directory will be used."),
+    host: str = typer.Option("127.0.0.1", help="The address to listen on."),
+    port: int = typer.Option(8765, help="The port to listen on."),
+    socket_path: str = typer.Option(None, "--socket", help="Listen on this unix socket instead of a TCP port."),
+    cache_mb: int = typer.Option(256, help="The size of the chat data kept decoded in memory, in megabytes.")
+):
+    """
+    Serve the chats over HTTP, keeping recently used chats decoded in memory.
+    """
+    from src.server import ChatService, run_server
+
+    try:
+        catalog = get_workspace_catalog(directory)
+    except (FileNotFoundError, ValueError) as e:
+        logger.error(str(e))
+        raise typer.Exit(code=1)
+
+    service = ChatService(catalog, cache_bytes=cache_mb << 20)
+    try:
+        run_server(service, host, port, socket_path)
+    except OSError as e:
+        logger.error(f"Failed to start the server: {e}")
+        raise typer.Exit(code=1)
+
+@app.command()
+def search(
+    directory: str = typer.Argument(None, help="The directory to search for state.vscdb files. If not provided, the default Cursor workspace storage directory will be used."),
+    term: list[str] = typer.Option(None, "--term", "-t", help="A text to search for. Repeat to search for several at once."),
+    terms_file: str = typer.Option(None, help="A file with one text to search for per line, in addition to --term."),
+    regex: bool = typer.Option(False, "--regex", help="Treat the search texts as regular expressions."),
+    case_sensitive: bool = typer.Option(False, "--case-sensitive", help="Match the case of the search texts."),
+    hits_per_tab: int = typer.Option(1, help="The number of hits shown per search text and tab. 0 shows every hit."),
+    context: int = typer.Option(60, help="The number of characters shown before and after each hit."),
+    jobs: int = typer.Option(1, "--jobs", "-j", help="The number of worker processes used to query and search the databases in parallel."),
+    output_json: bool = typer.Option(False, "--json", help="Print one JSON object per hit instead of a table.")
+):
+    """
+    Search all chats for several texts or regular expressions at once and show where each was found.
+    """
+    from src.search import ChatMatcher, search_dbs
+
+    queries = list(term or [])
+    if terms_file:
+        try:
+            with open(terms_file, 'r') as file:
+                queries.extend(line.rstrip('\n') for line in file if line.strip())
+        except IOError as e:
+            logger.error(f"Failed to read the search texts: {e}")
+            raise typer.Exit(code=1)
+
+    try:
+        matcher = ChatMatcher(queries, regex=regex, case_sensitive=case_sensitive, context=context, hits_per_tab=hits_per_tab)
+    except ValueError as e:
+        logger.error(str(e))
+        raise typer.Exit(code=1)
+
+    hit_count = 0
+    try:
+        db_paths = [db_path for db_path, _ in get_state_files(directory)]
+        for db_path, hits in search_dbs(db_paths, matcher, jobs=jobs):
+            if not hits:
+                continue
+            workspace = os.path.basename(os.path.dirname(db_path))
+            hit_count += len(hits)
+            if output_json:
+                for hit in hits:
+                    print(json.dumps({"workspace": workspace, "db_path": db_path, **hit}, ensure_ascii=False))
+                continue
+
+            from rich.markup import escape
+            from rich.table import Table
+            project = WorkspaceCatalog.read_project(os.path.dirname(db_path))
+            table = Table(title=f"{project or workspace} ({workspace})", title_justify="left", show_lines=False)
+            table.add_column("tab", justify="right")
+            table.add_column("bubble", justify="right")
+            table.add_column("query")
+            table.add_column("context")
+            for hit in hits:
+                table.add_row(str(hit['tab']), f"{hit['bubble']} {hit['role']}", escape(hit['query']), escape(hit['snippet']))
+            get_console().print(table)
+    except FileNotFoundError as e:
+        error_message = f"File not found: {e}"
+        logger.error(error_message)
+        raise typer.Exit(code=1)
+    except Exception as e:
+        error_message = f"Failed to search chat data: {e}"
+        logger.error(error_message)
+        raise typer.Exit(code=1)
+
+    if not output_json:
+        get_console().print(f"{hit_count} hits." if hit_count else "No results found.")
 
 @app.command()
 def discover(
     directory: str = typer.Argument(None, help="The directory to search for state.vscdb files. If not provided, the default Cursor workspace storage directory will be used."),
     limit: int = typer.Option(None, help="The maximum number of state.vscdb files to process. Defaults to 10 if search_text is not provided, else -1."),
-    search_text: str = typer.Option(None, help="The text to search for in the chat history.")
+    search_text: str = typer.Option(None, help="The text to search for in the chat history."),
+    jobs: int = typer.Option(1, "--jobs", "-j", help="The number of worker processes used to query and format the databases in parallel."),
+    no_index: bool = typer.Option(False, "--no-index", help="Scan every database instead of searching the full-text index."),
+    profile: bool = typer.Option(False, "--profile", help="Print the wall time and bytes of each stage."),
+    profile_memory: bool = typer.Option(False, "--profile-memory", help="Also trace the peak memory of each stage. Tracing slows the run down, so its wall times are not representative."),
+    profile_json: str = typer.Option(None, help="Write the per-stage and per-database profile to this JSON file.")
 ):
     """
     Discover all state.vscdb files in a directory and its subdirectories, and print a few lines of dialogue.
     """
-    if not directory:
-        directory = str(get_cursor_workspace_path())
-    
+    from rich.markdown import Markdown
+    from src.discover import discover_dbs
+    from src.index import ChatIndex
+
     if limit is None:
         limit = -1 if search_text else 10
 
-    try:
-        state_files = []
-        for root, _, files in os.walk(directory):
-            if 'state.vscdb' in files:
-                db_path = os.path.join(root, 'state.vscdb')
-                state_files.append((db_path, os.path.getmtime(db_path)))
+    profiler = Profiler(trace_memory=profile_memory) if profile or profile_memory or profile_json else None
 
-        # Sort files by modification time (newest first)
-        state_files.sort(key=lambda x: x[1], reverse=True)
+    try:
+        with profile_stage(profiler, "scan"):
+            state_files = get_state_files(directory)
 
         # Only process the newest files up to the specified limit, unless limit is -1
         if limit != -1:
             state_files = state_files[:limit]
 
-        results = []
+        # Process the files, printing the results in modification time order as they arrive
+        get_console().print('\n\n')
+        found = False
+        db_paths = [db_path for db_path, _ in state_files]
+        if search_text and not no_index:
+            # Only the databases that changed since the last run are read again
+            with ChatIndex(get_index_path()) as chat_index:
+                with profile_stage(profiler, "index.refresh"):
+                    chat_index.refresh(state_files, jobs=jobs)
+                with profile_stage(profiler, "index.search"):
+                    hits = chat_index.search(search_text, db_paths)
+            results = [(db_path, [preview for _, _, preview in tab_hits]) for db_path, tab_hits in groupby(hits, key=lambda hit: hit[0])]
+        else:
+            results = discover_dbs(db_paths, search_text, jobs=jobs, profiler=profiler)
 
-        # Process the files
-        for db_path, _ in state_files:
-            db_query = VSCDBQuery(db_path)
-            chat_data = db_query.query_aichat_data()
+        for db_path, previews in results:
+            for result in previews:
+                found = True
+                get_console().print(Markdown("---"))
+                get_console().print(f"DATABASE: [link=file://{os.path.dirname(db_path).replace(' ', '%20')}]'{db_path}'[/link]\n")
+                get_console().print(Markdown(result))
+                get_console().print('\n\n')
 
-            if "error" in chat_data:
-                error_message = f"Error querying chat data from {db_path}: {chat_data['error']}"
-                logger.error(error_message)
-            elif not chat_data:
-                logger.debug(f"No chat data found in {db_path}")
-            else:
-                chat_data_dict = json.loads(chat_data[0])
-                formatter = MarkdownChatFormatter()
-                formatted_chats = formatter.format(chat_data_dict, image_dir=None)
-                
-                if search_text:
-                    # Filter the formatted data to include only lines containing the search text
-                    for formatted_data in formatted_chats:
-                        filtered_lines = [line for line in formatted_data.splitlines() if search_text.lower() in line.lower()]
-                        if filtered_lines:
-                            results.append((db_path, "\n".join(formatted_data.splitlines()[:10]) + "\n..."))
-                    if not filtered_lines:
-                        logger.debug(f"No chat entries containing '{search_text}' found in {db_path}")
-                else:
-                    # Collect the first few lines of the formatted chat data
-                    for formatted_data in formatted_chats:
-                        results.append((db_path, "\n".join(formatted_data.splitlines()[:10]) + "\n..."))
-
-        # Print all results at the end
-        console.print('\n\n')
-        if results:
-            for db_path, result in results:
-                console.print(Markdown("---"))
-                folder_rel_path = os.path.join(os.path.basename(os.path.dirname(db_path)), os.path.basename(db_path))
-                console.print(f"DATABASE: [link=file://{os.path.dirname(db_path).replace(' ', '%20')}]'{db_path}'[/link]\n")
-                console.print(Markdown(result))
-                console.print('\n\n')
-        else:
-            console.print("No results found.")
+        if not found:
+            get_console().print("No results found.")
 
     except FileNotFoundError as e:
         error_message = f"File not found: {e}"
@@ -217,6 +628,9 @@ def discover(
         error_message = f"Failed to discover and print chat data: {e}"
         logger.error(error_message)
         raise typer.Exit(code=1)
+    finally:
+        if profiler is not None:
+            report_profile(profiler, profile_json)
 
 if __name__ == "__main__":
     app()
\ No newline at end of file
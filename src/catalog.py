@@ -0,0 +1,147 @@
+import os
+import json
+from typing import Any
+from urllib.parse import unquote, urlparse
+from loguru import logger
+from src.files import write_json
+from src.vscdb import VSCDBQuery
+
+class WorkspaceCatalog:
+    def __init__(self, catalog_path: str, storage_dir: str) -> None:
+        """
+        Load the catalog of a workspace storage directory, or start an empty one.
+
+        The catalog maps each workspace folder (named after a hash by Cursor) to the project it belongs to,
+        as recorded in its workspace.json, and to the size, modification time and tab count of its state.vscdb.
+        `refresh` only reads the workspaces whose database changed since the catalog was last saved.
+
+        Args:
+            catalog_path (str): The path to the JSON file the catalog is kept in.
+            storage_dir (str): The workspace storage directory, holding one folder per workspace.
+        """
+        self.catalog_path = catalog_path
+        self.storage_dir = storage_dir
+        self.workspaces: dict[str, dict[str, Any]] = {}
+
+        if os.path.exists(catalog_path):
+            try:
+                with open(catalog_path, 'r') as file:
+                    catalog = json.load(file)
+                # A catalog of another storage directory is of no use
+                if catalog.get('storage_dir') == storage_dir:
+                    self.workspaces = catalog.get('workspaces', {})
+            except (IOError, json.JSONDecodeError) as e:
+                logger.warning(f"Ignoring unreadable workspace catalog {catalog_path}: {e}")
+
+    @staticmethod
+    def read_project(workspace_dir: str) -> str | None:
+        """Read the path of the folder or workspace file a workspace was opened on.
+
+        Args:
+            workspace_dir (str): The workspace folder.
+
+        Returns:
+            str | None: The local path, the URI of a remote project, or None if it is unknown.
+        """
+        try:
+            with open(os.path.join(workspace_dir, 'workspace.json'), 'r') as file:
+                workspace = json.load(file)
+        except (IOError, json.JSONDecodeError):
+            return None
+        uri = workspace.get('folder') or workspace.get('workspace')
+        if not uri:
+            return None
+        parsed = urlparse(uri)
+        return unquote(parsed.path) if parsed.scheme == 'file' else uri
+
+    @classmethod
+    def export_name(cls, workspace_dir: str) -> str:
+        """Name the folder a workspace is exported to after its project, e.g. `myproject_1a2b3c4d`, or after the workspace folder if the project is unknown."""
+        folder = os.path.basename(workspace_dir.rstrip(os.sep))
+        project = cls.read_project(workspace_dir)
+        if not project:
+            return folder
+        return f"{os.path.basename(project.rstrip('/'))}_{folder[:8]}"
+
+    def refresh(self) -> dict[str, int]:
+        """Bring the catalog up to date with the storage directory and save it if anything changed.
+
+        Returns:
+            dict[str, int]: The number of workspaces updated, unchanged and removed.
+        """
+        stats = {'updated': 0, 'unchanged': 0, 'removed': 0}
+        seen = set()
+        with os.scandir(self.storage_dir) as entries:
+            for entry in entries:
+                if not entry.is_dir():
+                    continue
+                db_path = os.path.join(entry.path, 'state.vscdb')
+                try:
+                    db_stat = os.stat(db_path)
+                except OSError:
+                    continue
+                seen.add(entry.name)
+
+                workspace = self.workspaces.get(entry.name)
+                folder_mtime = entry.stat().st_mtime
+                if workspace is not None and (workspace['size'], workspace['mtime_ns']) == (db_stat.st_size, db_stat.st_mtime_ns):
+                    workspace['folder_mtime'] = folder_mtime
+                    stats['unchanged'] += 1
+                    continue
+
+                tab_count = VSCDBQuery(db_path).query_aichat_tab_count()
+                self.workspaces[entry.name] = {
+                    'db_path': db_path,
+                    'project': self.read_project(entry.path),
+                    'size': db_stat.st_size,
+                    'mtime_ns': db_stat.st_mtime_ns,
+                    'folder_mtime': folder_mtime,
+                    'tab_count': tab_count if isinstance(tab_count, int) else None,
+                }
+                stats['updated'] += 1
+
+        for folder in set(self.workspaces) - seen:
+            del self.workspaces[folder]
+            stats['removed'] += 1
+
+        # Folder times change all the time, so they alone are not worth rewriting the catalog
+        if stats['updated'] or stats['removed'] or not os.path.exists(self.catalog_path):
+            self.save()
+        logger.debug(f"Workspace catalog refreshed: {stats}")
+        return stats
+
+    def save(self) -> None:
+        """Write the catalog to its file."""
+        os.makedirs(os.path.dirname(self.catalog_path) or '.', exist_ok=True)
+        write_json(self.catalog_path, {'storage_dir': self.storage_dir, 'workspaces': self.workspaces})
+
+    def state_files(self) -> list[tuple[str, float]]:
+        """Return the state.vscdb files and their modification times, newest first.
+
+        The times are `st_mtime_ns / 1e9`, which `find_state_files` uses too; `os.path.getmtime` may differ in the last bit.
+        """
+        state_files = [(workspace['db_path'], workspace['mtime_ns'] / 1e9) for workspace in self.workspaces.values()]
+        state_files.sort(key=lambda x: x[1], reverse=True)
+        return state_files
+
+    def latest(self) -> str | None:
+        """Return the state.vscdb of the workspace folder modified last, or None if there are none."""
+        if not self.workspaces:
+            return None
+        return max(self.workspaces.values(), key=lambda workspace: workspace['folder_mtime'])['db_path']
+
+    def find_project(self, name: str) -> list[dict[str, Any]]:
+        """Find the workspaces of a project, most recently used first.
+
+        Args:
+            name (str): The name of the project folder, or its full path.
+
+        Returns:
+            list[dict[str, Any]]: The catalog entries of the matching workspaces.
+        """
+        matches = [
+            workspace for workspace in self.workspaces.values()
+            if workspace['project'] and name in (workspace['project'], os.path.basename(workspace['project'].rstrip('/')))
+        ]
+        matches.sort(key=lambda workspace: workspace['folder_mtime'], reverse=True)
+        return matches
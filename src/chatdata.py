@@ -0,0 +1,109 @@
+import re
+import json
+from typing import Any, Iterator
+from src.model import Tab
+
+# Incremental reader for the `workbench.panel.aichat.view.aichat.chatdata` value.
+#
+# The value is a single JSON document of the form {"tabs": [{...}, {...}], ...}. Instead of
+# decoding it as a whole, the reader walks the root object and the tabs array by hand and
+# decodes one tab at a time with the C decoder, so at most one decoded tab is alive at once.
+# Each decoded tab is turned into a compact `Tab` right away and its raw dictionaries dropped.
+# Skipping a tab by scanning its structure in Python was measured to cost about five times
+# more than decoding and dropping it, so unwanted tabs are decoded and dropped right away.
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+_decoder = json.JSONDecoder()
+
+def _skip_whitespace(doc: str, pos: int) -> int:
+    return _WHITESPACE.match(doc, pos).end()
+
+def _expect(doc: str, pos: int, chars: str, message: str) -> str:
+    char = doc[pos:pos + 1]
+    if not char or char not in chars:
+        raise json.JSONDecodeError(message, doc, pos)
+    return char
+
+def _find_member(doc: str, pos: int, wanted_key: str) -> int | None:
+    """Return the start of the value of a member of the object starting at `pos`.
+
+    The values of the members before it are decoded and dropped, the ones after it are not looked at.
+    """
+    _expect(doc, pos, '{', "Expecting object")
+    pos = _skip_whitespace(doc, pos + 1)
+    if doc[pos:pos + 1] == '}':
+        return None
+    while True:
+        _expect(doc, pos, '"', "Expecting property name enclosed in double quotes")
+        key, pos = _decoder.raw_decode(doc, pos)
+        pos = _skip_whitespace(doc, pos)
+        _expect(doc, pos, ':', "Expecting ':' delimiter")
+        start = _skip_whitespace(doc, pos + 1)
+        if key == wanted_key:
+            return start
+        _, pos = _decoder.raw_decode(doc, start)
+        pos = _skip_whitespace(doc, pos)
+        if _expect(doc, pos, ',}', "Expecting ',' delimiter") == '}':
+            return None
+        pos = _skip_whitespace(doc, pos + 1)
+
+def _iter_raw_tabs(chat_data: str | bytes, tab_ids: list[int] | None = None) -> Iterator[tuple[int, dict[str, Any]]]:
+    # The tabs after the last wanted one are never read
+    last_tab_id = max(tab_ids, default=-1) if tab_ids is not None else None
+    if last_tab_id == -1:
+        return
+    doc = chat_data.decode('utf-8') if isinstance(chat_data, bytes) else chat_data
+    pos = _find_member(doc, _skip_whitespace(doc, 0), 'tabs')
+    if pos is None:
+        return
+
+    _expect(doc, pos, '[', "Expecting array")
+    pos = _skip_whitespace(doc, pos + 1)
+    if doc[pos:pos + 1] == ']':
+        return
+    tab_index = 0
+    while True:
+        tab, pos = _decoder.raw_decode(doc, pos)
+        if tab_ids is None or tab_index in tab_ids:
+            yield tab_index, tab
+        del tab
+        if last_tab_id is not None and tab_index >= last_tab_id:
+            return
+        pos = _skip_whitespace(doc, pos)
+        if _expect(doc, pos, ',]', "Expecting ',' delimiter") == ']':
+            return
+        pos = _skip_whitespace(doc, pos + 1)
+        tab_index += 1
+
+def iter_tabs(chat_data: str | bytes, tab_ids: list[int] | None = None) -> Iterator[tuple[int, Tab]]:
+    """Decode the tabs of a chatdata value one at a time.
+
+    Args:
+        chat_data (str | bytes): The raw chatdata value as stored in the database.
+        tab_ids (list[int] | None): List of tab indices to yield exclusively. The others are dropped as soon as
+            they are read, and the tabs after the last of them are not read at all.
+
+    Yields:
+        tuple[int, Tab]: The tab index and the decoded tab.
+    """
+    for tab_index, tab in _iter_raw_tabs(chat_data, tab_ids):
+        yield tab_index, Tab.from_dict(tab)
+
+def latest_tab(chat_data: str | bytes) -> tuple[int, Tab] | None:
+    """Find the tab with the latest timestamp in a single pass, keeping only the latest decoded tab so far.
+
+    Args:
+        chat_data (str | bytes): The raw chatdata value as stored in the database.
+
+    Returns:
+        tuple[int, Tab] | None: The index of the latest tab and the tab, or None if there are no tabs.
+    """
+    latest_index, latest_timestamp, latest_raw_tab = None, None, None
+    for tab_index, tab in _iter_raw_tabs(chat_data):
+        timestamp = tab.get('timestamp', 0)
+        if latest_timestamp is None or timestamp > latest_timestamp:
+            latest_index, latest_timestamp, latest_raw_tab = tab_index, timestamp, tab
+    if latest_raw_tab is None:
+        return None
+    return latest_index, Tab.from_dict(latest_raw_tab)
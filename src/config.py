@@ -0,0 +1,38 @@
+from pathlib import Path
+from typing import Any
+from loguru import logger
+
+CONFIG_PATH = Path("config.yml")
+
+_config: dict[str, Any] | None = None
+
+def load_config() -> dict[str, Any]:
+    """Load the configuration file, parsing it only once per process.
+
+    YAML is imported on the first call, so commands that never need the configuration do not pay for it.
+
+    Returns:
+        dict[str, Any]: The configuration.
+
+    Raises:
+        FileNotFoundError: If the configuration file does not exist.
+        ValueError: If the configuration file is not valid YAML.
+    """
+    global _config
+    if _config is not None:
+        return _config
+
+    logger.debug(f"Looking for configuration file at: {CONFIG_PATH}")
+    if not CONFIG_PATH.exists():
+        error_message = f"Configuration file not found: {CONFIG_PATH}"
+        logger.error(error_message)
+        raise FileNotFoundError(error_message)
+
+    import yaml
+    try:
+        with open(CONFIG_PATH, 'r') as f:
+            _config = yaml.safe_load(f)
+    except yaml.YAMLError as e:
+        raise ValueError(f"Error parsing config file: {e}") from e
+    logger.debug("Configuration file loaded successfully")
+    return _config
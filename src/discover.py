@@ -0,0 +1,123 @@
+import json
+from typing import Any, Iterator
+from loguru import logger
+from src.vscdb import VSCDBQuery
+from src.export import MarkdownChatFormatter
+from src.chatdata import iter_tabs
+from src.pool import pool_map
+from src.profiling import Profiler
+
+PREVIEW_LINES = 10
+
+def can_push_down(search_text: str) -> bool:
+    """Check whether a search can be pre-filtered on the raw chat data inside SQLite.
+
+    The search runs on the formatted Markdown, while SQLite only sees the JSON value. The
+    pre-filter is only safe when every hit in the Markdown is also a hit in the JSON: the text
+    must look the same JSON-encoded, SQLite's `lower` must fold it like Python does, and it must
+    not overlap the text the formatter adds around the bubbles.
+
+    Args:
+        search_text (str): The text to search for.
+
+    Returns:
+        bool: True if databases whose raw value lacks the text cannot contain a hit.
+    """
+    if not search_text.isascii() or not search_text.isprintable() or '"' in search_text or '\\' in search_text:
+        return False
+    text = search_text.lower()
+    for template_text in MarkdownChatFormatter.TEMPLATE_TEXTS:
+        template_text = template_text.lower()
+        if text in template_text or template_text in text:
+            return False
+        # The search text could start inside the template text or end inside it
+        for size in range(1, min(len(text), len(template_text))):
+            if text[:size] == template_text[-size:] or text[-size:] == template_text[:size]:
+                return False
+    return True
+
+def discover_db(db_path: str, search_text: str | None = None, profiler: Profiler | None = None) -> list[str]:
+    """Query, decode and format the chats of a single database and return previews.
+
+    This is the unit of work of `discover`. It is a module-level function so it can be
+    shipped to worker processes.
+
+    Args:
+        db_path (str): The path to the state.vscdb file.
+        search_text (str | None): Only return tabs containing this text (case-insensitive).
+        profiler (Profiler | None): The profiler recording the time spent in each stage.
+
+    Returns:
+        list[str]: The preview of every matching tab, in tab order.
+    """
+    if profiler is not None:
+        with profiler.database(db_path):
+            return _discover_db(db_path, search_text, profiler)
+    return _discover_db(db_path, search_text, None)
+
+def _discover_db_profiled(db_path: str, search_text: str | None, trace_memory: bool) -> tuple[list[str], list[dict[str, Any]]]:
+    # Worker processes profile on their own and send their records back
+    profiler = Profiler(trace_memory=trace_memory)
+    previews = discover_db(db_path, search_text, profiler)
+    profiler.stop()
+    return previews, profiler.to_records()
+
+def _discover_db(db_path: str, search_text: str | None, profiler: Profiler | None) -> list[str]:
+    db_query = VSCDBQuery(db_path, profiler=profiler)
+    # Let SQLite reject the databases not containing the search text before anything is decoded
+    pushed_down = bool(search_text) and can_push_down(search_text)
+    chat_data = db_query.query_aichat_data(search_text if pushed_down else None)
+
+    if "error" in chat_data:
+        logger.error(f"Error querying chat data from {db_path}: {chat_data['error']}")
+        return []
+    if not chat_data:
+        if pushed_down:
+            logger.debug(f"No chat entries containing '{search_text}' found in {db_path}")
+        else:
+            logger.debug(f"No chat data found in {db_path}")
+        return []
+
+    # Only the beginning of each tab is formatted, up to the preview budget and the first search hit
+    formatter = MarkdownChatFormatter(profiler=profiler)
+    previews = []
+    tabs = iter_tabs(chat_data[0])
+    if profiler is not None:
+        tabs = profiler.iterate("decode", tabs)
+    try:
+        for tab_index, tab in tabs:
+            preview = formatter.preview(tab_index, tab, max_lines=PREVIEW_LINES, search_text=search_text)
+            if preview is not None:
+                previews.append(preview)
+    except json.JSONDecodeError as e:
+        logger.error(f"JSON decode error in {db_path}: {e}")
+        return []
+    except Exception as e:
+        logger.error(f"Failed to format chat data from {db_path}: {e}")
+        return []
+
+    if search_text and not previews:
+        logger.debug(f"No chat entries containing '{search_text}' found in {db_path}")
+    return previews
+
+def discover_dbs(db_paths: list[str], search_text: str | None = None, jobs: int = 1, profiler: Profiler | None = None) -> Iterator[tuple[str, list[str]]]:
+    """Run `discover_db` over several databases, optionally on a process pool.
+
+    Results are yielded in the order of `db_paths` as soon as they are available.
+
+    Args:
+        db_paths (list[str]): The paths to the state.vscdb files.
+        search_text (str | None): Only return tabs containing this text (case-insensitive).
+        jobs (int): The number of worker processes. 1 runs everything in this process.
+        profiler (Profiler | None): The profiler recording the time spent in each stage, also in the worker processes.
+
+    Yields:
+        tuple[str, list[str]]: The database path and the previews of its matching tabs.
+    """
+    if profiler is None or jobs <= 1 or len(db_paths) <= 1:
+        yield from pool_map(discover_db, db_paths, search_text, profiler, jobs=jobs)
+        return
+
+    for db_path, (previews, records) in pool_map(_discover_db_profiled, db_paths, search_text, profiler.trace_memory, jobs=jobs):
+        profiler.merge(records)
+        yield db_path, previews
@@ -1,19 +1,52 @@
 import re
-import shutil
 import os
+import io
 import json
+import gzip
+import time
+import shutil
+import hashlib
+import tarfile
+import zipfile
+import threading
 from abc import ABC, abstractmethod
-from typing import Any
+from concurrent.futures import Future
+from typing import IO, Any, Iterable, Iterator
 from loguru import logger
+from src.files import write_json
+from src.images import ImageStore
+from src.model import MISSING_USER_TEXT, Bubble, Tab
+from src.profiling import Profiler, profile_stage
 import traceback
 
+ChatData = dict[str, Any] | Iterable[tuple[int, Tab | dict[str, Any]]]
+
 class ChatFormatter(ABC):
+    @staticmethod
+    def _iter_tabs(chat_data: ChatData, tab_ids: list[int] | None = None) -> Iterator[tuple[int, Tab]]:
+        """Iterate over the tabs of either a decoded chat data dictionary or a stream of (tab index, tab) pairs.
+
+        Tabs still in their decoded JSON form are turned into `Tab`s.
+        """
+        tabs = enumerate(chat_data['tabs']) if isinstance(chat_data, dict) else chat_data
+        for tab_index, tab in tabs:
+            if tab_ids is None or tab_index in tab_ids:
+                yield tab_index, Tab.from_dict(tab) if isinstance(tab, dict) else tab
+
+    def close(self) -> set[int]:
+        """Finish any work still running in the background, such as copying images.
+
+        Returns:
+            set[int]: The indices of the formatted tabs whose background work failed.
+        """
+        return set()
+
     @abstractmethod
-    def format(self, chat_data: dict[str, Any], image_dir: str = 'images') -> dict[int, str] | None:
+    def format(self, chat_data: ChatData, image_dir: str = 'images') -> dict[int, str] | None:
         """Format the chat data into Markdown format.
 
         Args:
-            chat_data (dict[str, Any]): The chat data to format.
+            chat_data (ChatData): The chat data to format, either decoded as a whole or as an iterator of (tab index, tab) pairs.
             image_dir (str): The directory where images will be saved. Defaults to 'images'.
 
         Returns:
@@ -22,51 +55,168 @@ class ChatFormatter(ABC):
         pass
 
 class MarkdownChatFormatter(ChatFormatter):
-    def _extract_text_from_user_bubble(self, bubble: dict) -> str:
-        try:
-            if "delegate" in bubble:
-                if bubble["delegate"]:
-                    user_text_text = bubble['delegate']["a"]
-                else:
-                    user_text_text = ""
-            elif "text" in bubble:
-                if bubble["text"]:
-                    user_text_text = bubble['text']
-                else:
-                    user_text_text = ""
-            elif "initText" in bubble:
-                if bubble["initText"]:
-                    try:
-                        user_text_text = json.loads(bubble["initText"])['root']['children'][0]['children'][0]['text']
-                    except Exception as e:
-                        user_text_text = "[ERROR: no user text found]"
-                        logger.error(f"Couldn't find user text entry in one of the bubbles. Error: {e}")
-                        logger.debug(f"Bubble:\n{json.dumps(bubble, indent=4)}")
-                else:
-                    user_text_text = ""
-            elif "rawText" in bubble:
-                if bubble["rawText"]:
-                    user_text_text = bubble['text']
+    # Text the formatter adds around the bubbles' content
+    TEMPLATE_TEXTS = (
+        "# Chat Transcript - Tab ",
+        "## User:",
+        "[selections]  ",
+        "[image]  ",
+        "![User Image](",
+        "[text]  ",
+        MISSING_USER_TEXT,
+        "## AI (",
+        "Unknown",
+        "):",
+    )
+
+    def __init__(self, profiler: Profiler | None = None, image_saver: "FileSaver | None" = None) -> None:
+        """Initialize the MarkdownChatFormatter.
+
+        Args:
+            profiler (Profiler | None): The profiler recording the time spent formatting, rewriting AI answers and storing images.
+            image_saver (FileSaver | None): The saver images are stored through. Images are copied to the file system if None.
+        """
+        self.profiler = profiler
+        self.image_saver = image_saver
+        self._image_stores: dict[str, ImageStore] = {}
+        self._tab_images: dict[int, set[tuple[str, str]]] = {}
+
+    def _get_image_store(self, image_dir: str) -> ImageStore:
+        if image_dir not in self._image_stores:
+            self._image_stores[image_dir] = ImageStore(image_dir, profiler=self.profiler, saver=self.image_saver)
+        return self._image_stores[image_dir]
+
+    def close(self) -> set[int]:
+        """Wait until the images referenced by the formatted chats are stored.
+
+        Returns:
+            set[int]: The indices of the formatted tabs linking an image that could not be stored.
+        """
+        failed_images = set()
+        for image_dir, image_store in self._image_stores.items():
+            failed_images.update((image_dir, link) for link in image_store.close())
+        failed_tabs = {tab_index for tab_index, images in self._tab_images.items() if images & failed_images}
+        self._tab_images.clear()
+        return failed_tabs
+
+    def _schedule_images(self, tab: Tab, image_dir: str) -> dict[str, Future]:
+        # Every image of the tab is hashed on the pool at once, while the bubbles before it are formatted
+        images = {}
+        for bubble in tab.bubbles:
+            image_path = bubble.image_path
+            if bubble.role == 'user' and image_path is not None and image_path not in images and os.path.exists(image_path):
+                images[image_path] = self._get_image_store(image_dir).add(image_path)
+        return images
+
+    def _format_bubble(self, bubble: Bubble, tab_index: int, image_dir: str | None, images: dict[str, Future]) -> str | None:
+        # USER
+        if bubble.role == 'user':
+            user_text = ["## User:\n\n"]
+            
+            # Selections
+            if bubble.selections:
+                user_text.append(f"[selections]  \n{"\n".join(bubble.selections)}")
+            
+            # Images
+            if bubble.image_path is not None and image_dir is not None:
+                image_path = bubble.image_path
+                if image_path in images:
+                    new_image_path = self._image_stores[image_dir].link(images[image_path].result())
+                    self._tab_images.setdefault(tab_index, set()).add((image_dir, new_image_path))
+                    user_text.append(f"[image]  \n![User Image]({new_image_path})")
                 else:
-                    user_text_text = ""
-            else:
-                user_text_text = "[ERROR: no user text found]"
-                logger.error(f"Couldn't find user text entry in one of the bubbles.")
-                logger.debug(f"Bubble:\n{json.dumps(bubble, indent=4)}")
-        
-        except Exception as e:
-            user_text_text = "[ERROR: no user text found]"
-            logger.error(f"Couldn't find user text entry in one of the bubbles. Error: {e}")
-            logger.debug(f"Bubble:\n{json.dumps(bubble, indent=4)}")
+                    logger.error(f"Image file {image_path} not found for tab {tab_index + 1}.")
+                    user_text.append(f"[image]  \n![User Image]()")
+            
+            # Text
+            if bubble.text:
+                user_text.append(f"[text]  \n{bubble.text}")
+            
+            user_text.append("\n")
+
+            if len(user_text) > 2:
+                return "\n".join(user_text)
+        # AI
+        elif bubble.role == 'ai':
+            with profile_stage(self.profiler, "format.ai_rewrite") as measured:
+                raw_text = re.sub(r'```python:[^\n]+', '```python', bubble.text)
+                measured["bytes"] = len(raw_text)
+            return f"## AI ({bubble.model_type}):\n\n{raw_text}\n"
+        return None
+
+    def iter_tab(self, tab_index: int, tab: Tab, image_dir: str | None = 'images') -> Iterator[str]:
+        """Lazily format a single tab, one Markdown chunk per bubble.
+
+        Joining the chunks with newlines gives the same transcript as `format`.
+
+        Args:
+            tab_index (int): The index of the tab.
+            tab (Tab): The tab to format.
+            image_dir (str | None): The directory where images will be saved. Images are skipped if None.
+
+        Yields:
+            str: The tab title, then the Markdown of each bubble.
+        """
+        images = self._schedule_images(tab, image_dir) if image_dir is not None else {}
+        yield f"# Chat Transcript - Tab {tab_index + 1}\n"
+        for bubble in tab.bubbles:
+            formatted_bubble = self._format_bubble(bubble, tab_index, image_dir, images)
+            if formatted_bubble is not None:
+                yield formatted_bubble
+
+    def preview(self, tab_index: int, tab: Tab, max_lines: int = 10, max_chars: int | None = None, search_text: str | None = None) -> str | None:
+        """Format only the beginning of a tab.
+
+        Bubbles are formatted one by one until the preview budget is filled and, if searching,
+        until a line containing the search text was found. The rest of the tab is never formatted.
 
-        return user_text_text
-    
-    def format(self, chat_data: dict[str, Any], image_dir: str | None = 'images', tab_ids: list[int] | None = None) -> dict[int, str] | None:
+        Args:
+            tab_index (int): The index of the tab.
+            tab (Tab): The tab to preview.
+            max_lines (int): The maximum number of lines of the preview.
+            max_chars (int | None): The maximum number of characters of the preview.
+            search_text (str | None): Only preview the tab if one of its lines contains this text (case-insensitive).
+
+        Returns:
+            str | None: The first lines of the tab followed by an ellipsis, or None if the search text was not found.
+        """
+        with profile_stage(self.profiler, "preview"):
+            return self._preview(tab_index, tab, max_lines, max_chars, search_text)
+
+    def _preview(self, tab_index: int, tab: Tab, max_lines: int, max_chars: int | None, search_text: str | None) -> str | None:
+        search_text_lower = search_text.lower() if search_text else None
+        found = search_text_lower is None
+        chunks = []
+        preview_lines = None
+        for chunk in self.iter_tab(tab_index, tab, image_dir=None):
+            if preview_lines is None:
+                # Chunks are separated by line breaks, so the lines so far are the first lines of the whole transcript
+                chunks.append(chunk)
+                text = "\n".join(chunks)
+                lines = text.splitlines()
+                if len(lines) >= max_lines or (max_chars is not None and len(text) >= max_chars):
+                    preview_lines = lines[:max_lines]
+            if not found:
+                found = any(search_text_lower in line.lower() for line in chunk.splitlines())
+            if found and preview_lines is not None:
+                break
+
+        if not found:
+            return None
+        if preview_lines is None:
+            preview_lines = "\n".join(chunks).splitlines()
+        preview = "\n".join(preview_lines)
+        if max_chars is not None:
+            preview = preview[:max_chars]
+        return preview + "\n..."
+
+    def format(self, chat_data: ChatData, image_dir: str | None = 'images', tab_ids: list[int] | None = None) -> dict[int, str] | None:
         """Format the chat data into Markdown format.
 
         Args:
-            chat_data (dict[str, Any]): The chat data to format.
+            chat_data (ChatData): The chat data to format, either decoded as a whole or as an iterator of (tab index, tab) pairs.
             image_dir (str): The directory where images will be saved. Defaults to 'images'.
+                The images are stored under their content hash and copied in the background until `close` is called.
             tab_ids (list[int]): List of tab indices to include exclusively.
 
         Returns:
@@ -74,117 +224,494 @@ class MarkdownChatFormatter(ChatFormatter):
         """
         try:
             formatted_chats = {}
-            for tab_index, tab in enumerate(chat_data['tabs']):
-                if tab_ids is not None:
-                    if tab_index not in tab_ids:
-                        continue
-
-                bubbles = tab['bubbles']
-                formatted_chat = [f"# Chat Transcript - Tab {tab_index + 1}\n"]
-
-                for bubble in bubbles:
-                    # USER
-                    if bubble['type'] == 'user':
-                        user_text = ["## User:\n\n"]
-                        
-                        # Selections
-                        if "selections" in bubble and bubble["selections"]:
-                            user_text.append(f"[selections]  \n{"\n".join([s["text"] for s in bubble['selections']])}")
-                        
-                        # Images
-                        if 'image' in bubble and image_dir is not None:
-                            image_path = bubble['image']['path']
-                            if os.path.exists(image_path):
-                                image_filename = os.path.basename(image_path)
-                                new_image_path = os.path.join(tab_image_dir, image_filename)
-                                tab_image_dir = os.path.join(image_dir, f"tab_{tab_index + 1}") if image_dir else None
-                                if tab_image_dir is not None:
-                                    os.makedirs(tab_image_dir, exist_ok=True)
-                                shutil.copy(image_path, new_image_path)
-                                user_text.append(f"[image]  \n![User Image]({new_image_path})")
-                            else:
-                                logger.error(f"Image file {image_path} not found for tab {tab_index + 1}.")
-                                user_text.append(f"[image]  \n![User Image]()")
-                        
-                        # Text
-                        user_text_text = self._extract_text_from_user_bubble(bubble)
-                        if user_text_text:
-                            user_text.append(f"[text]  \n{user_text_text}")
-                        
-                        user_text.append("\n")
-
-                        if len(user_text) > 2:
-                            formatted_chat.append("\n".join(user_text))
-                    # AI
-                    elif bubble['type'] == 'ai':
-                        model_type = bubble.get('modelType', 'Unknown')
-                        raw_text = re.sub(r'```python:[^\n]+', '```python', bubble['rawText'])
-                        formatted_chat.append(f"## AI ({model_type}):\n\n{raw_text}\n")
-
-                formatted_chats[f"tab_{tab_index + 1}"] = "\n".join(formatted_chat)
+            for tab_index, tab in self._iter_tabs(chat_data, tab_ids):
+                with profile_stage(self.profiler, "format") as measured:
+                    formatted_chats[f"tab_{tab_index + 1}"] = "\n".join(self.iter_tab(tab_index, tab, image_dir))
+                    measured["bytes"] = len(formatted_chats[f"tab_{tab_index + 1}"])
 
             logger.success("Chats formatted.")
             return formatted_chats
+        except json.JSONDecodeError:
+            # Raised while decoding a streamed tab, let the caller report it
+            raise
+        except Exception as e:
+            logger.error(f"Unexpected error: {e}. Full traceback: {traceback.format_exc()}")
+            return
+
+class JsonlChatFormatter(ChatFormatter):
+    def format(self, chat_data: ChatData, image_dir: str | None = None, tab_ids: list[int] | None = None, workspace: str | None = None) -> dict[int, str] | None:
+        """Format the chat data into JSON Lines, one normalized record per bubble.
+
+        Tabs and bubbles are numbered from 1. `timestamp` is when the bubble was sent, null if Cursor did not
+        record it, and `tab_timestamp` when the tab was last used.
+
+        Args:
+            chat_data (ChatData): The chat data to format, either decoded as a whole or as an iterator of (tab index, tab) pairs.
+            image_dir (str | None): Unused, images are not part of the records.
+            tab_ids (list[int]): List of tab indices to include exclusively.
+            workspace (str | None): The workspace the chat data belongs to, added to every record.
+
+        Returns:
+            dict[int, str]: The JSON Lines of each tab.
+        """
+        try:
+            formatted_chats = {}
+            for tab_index, tab in self._iter_tabs(chat_data, tab_ids):
+                lines = []
+                for bubble_index, bubble in enumerate(tab.bubbles):
+                    if bubble.role not in ('user', 'ai'):
+                        continue
+                    record = {
+                        "workspace": workspace,
+                        "tab": tab_index + 1,
+                        "bubble": bubble_index + 1,
+                        "role": bubble.role,
+                        "model_type": bubble.model_type,
+                        "text": bubble.text,
+                        "timestamp": bubble.timestamp,
+                        "tab_timestamp": tab.timestamp,
+                    }
+                    lines.append(json.dumps(record, ensure_ascii=False))
+                formatted_chats[f"tab_{tab_index + 1}"] = "".join(f"{line}\n" for line in lines)
+            return formatted_chats
+        except json.JSONDecodeError:
+            raise
         except Exception as e:
             logger.error(f"Unexpected error: {e}. Full traceback: {traceback.format_exc()}")
             return
 
 class FileSaver(ABC):
     @abstractmethod
-    def save(self, formatted_data: str, file_path: str) -> None:
+    def save(self, formatted_data: str, file_path: str) -> bool:
         """Save the formatted data to a file.
 
         Args:
             formatted_data (str): The formatted data to save.
             file_path (str): The path to the file where the data will be saved.
+
+        Returns:
+            bool: True if the data was saved, False if saving failed.
         """
+        return False
+
+    def close(self) -> None:
+        """Flush and close anything the saver keeps open."""
+        pass
+
+    def make_dirs(self, dir_path: str) -> None:
+        """Create a directory files will be saved in."""
+        os.makedirs(dir_path, exist_ok=True)
+
+    def exists(self, file_path: str) -> bool:
+        """Check whether a file was saved before."""
+        return os.path.exists(file_path)
+
+    def read(self, file_path: str) -> str | None:
+        """Read a file saved before, or return None if it cannot be read back."""
+        try:
+            with open(file_path, 'r') as file:
+                return file.read()
+        except (IOError, UnicodeDecodeError):
+            return None
+
+    def save_file(self, source_path: str, file_path: str) -> None:
+        """Save a copy of an existing file, such as an image."""
+        shutil.copyfile(source_path, file_path)
+
+    def add_contents(self, file_path: str, title: str | None) -> None:
+        """Record a saved chat for a table of contents. Only savers writing one are interested."""
         pass
 
 class MarkdownFileSaver(FileSaver):
-    def save(self, formatted_data: str, file_path: str) -> None:
+    def save(self, formatted_data: str, file_path: str) -> bool:
         """Save the formatted data to a Markdown file.
 
         Args:
             formatted_data (str): The formatted data to save.
             file_path (str): The path to the Markdown file where the data will be saved.
+
+        Returns:
+            bool: True if the data was saved, False if saving failed.
         """
         try:
             with open(file_path, 'w') as file:
                 file.write(formatted_data)
             logger.info(f"Chat has been formatted and saved as {file_path}")
+            return True
         except IOError as e:
             logger.error(f"IOError: {e}")
         except Exception as e:
             logger.error(f"Unexpected error: {e}")
+        return False
+
+class JsonlFileSaver(FileSaver):
+    def __init__(self, compress: bool = False, batch_size: int = 1 << 20) -> None:
+        """Initialize the JsonlFileSaver, which appends the formatted data of many tabs to a single file.
+
+        Data is buffered and written in batches, so memory stays bounded by the batch size however
+        many workspaces are exported. Call `close` to write the last batch.
+
+        Args:
+            compress (bool): Write a gzip-compressed file.
+            batch_size (int): The number of characters buffered before they are written.
+        """
+        self.compress = compress
+        self.batch_size = batch_size
+        self._files: dict[str, IO[str]] = {}
+        self._buffers: dict[str, list[str]] = {}
+        self._buffered: dict[str, int] = {}
+
+    def _open(self, file_path: str) -> IO[str]:
+        if file_path not in self._files:
+            os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+            if self.compress:
+                self._files[file_path] = gzip.open(file_path, 'wt', encoding='utf-8')
+            else:
+                self._files[file_path] = open(file_path, 'w', encoding='utf-8')
+            self._buffers[file_path] = []
+            self._buffered[file_path] = 0
+        return self._files[file_path]
+
+    def _flush(self, file_path: str) -> None:
+        self._files[file_path].write("".join(self._buffers[file_path]))
+        self._buffers[file_path].clear()
+        self._buffered[file_path] = 0
+
+    def save(self, formatted_data: str, file_path: str) -> bool:
+        """Append the formatted data to a JSON Lines file.
+
+        Args:
+            formatted_data (str): The JSON Lines to append.
+            file_path (str): The path to the JSON Lines file. It is truncated when first written to.
+
+        Returns:
+            bool: True if the data was buffered or written, False if writing failed.
+        """
+        try:
+            self._open(file_path)
+            self._buffers[file_path].append(formatted_data)
+            self._buffered[file_path] += len(formatted_data)
+            if self._buffered[file_path] >= self.batch_size:
+                self._flush(file_path)
+            return True
+        except IOError as e:
+            logger.error(f"IOError: {e}")
+        except Exception as e:
+            logger.error(f"Unexpected error: {e}")
+        return False
+
+    def close(self) -> bool:
+        """Write the buffered data and close the files.
+
+        Returns:
+            bool: True if every file was written and closed, False otherwise.
+        """
+        success = True
+        for file_path, file in self._files.items():
+            try:
+                self._flush(file_path)
+                file.close()
+                logger.info(f"Chats have been saved to {file_path}")
+            except IOError as e:
+                logger.error(f"IOError: {e}")
+                success = False
+        self._files.clear()
+        self._buffers.clear()
+        self._buffered.clear()
+        return success
+
+class ArchiveFileSaver(FileSaver):
+    CONTENTS_NAME = 'index.md'
+
+    def __init__(self, archive_path: str, compress: bool = False, buffer_size: int = 1 << 20) -> None:
+        """Initialize the ArchiveFileSaver, which writes all files to a single zip or tar archive.
+
+        The archive is written sequentially through one buffered file, so saving thousands of tabs costs a
+        single open and close, which is what matters on network and encrypted file systems. The format is
+        taken from the file name: `.zip`, `.tar`, `.tar.gz`/`.tgz`, `.tar.bz2` or `.tar.xz`. `close` adds
+        a table of contents, `index.md`, linking every saved chat, and finishes the archive.
+
+        Files may be saved from several threads, writes are serialized.
+
+        Args:
+            archive_path (str): The path to the archive.
+            compress (bool): Compress a `.zip` with deflate, or a plain `.tar` with gzip. Other tar extensions choose their own compression.
+            buffer_size (int): The number of bytes buffered before they are written to the file.
+        """
+        self.archive_path = archive_path
+        self._lock = threading.Lock()
+        self._members: set[str] = set()
+        self._contents: list[tuple[str, str | None]] = []
+
+        # The format is checked before the file is opened, so an existing file of another kind is never truncated
+        name = archive_path.lower()
+        if name.endswith('.zip'):
+            mode = None
+        elif name.endswith(('.tar.gz', '.tgz')):
+            mode = 'w|gz'
+        elif name.endswith('.tar.bz2'):
+            mode = 'w|bz2'
+        elif name.endswith('.tar.xz'):
+            mode = 'w|xz'
+        elif name.endswith('.tar'):
+            mode = 'w|gz' if compress else 'w|'
+        else:
+            raise ValueError(f"Unknown archive format: {archive_path}. Expected .zip, .tar, .tar.gz, .tgz, .tar.bz2 or .tar.xz")
+
+        os.makedirs(os.path.dirname(archive_path) or ".", exist_ok=True)
+        self._file = open(archive_path, 'wb', buffering=buffer_size)
+        if mode is None:
+            compression = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+            self._zip: zipfile.ZipFile | None = zipfile.ZipFile(self._file, 'w', compression=compression)
+            self._tar: tarfile.TarFile | None = None
+        else:
+            # Stream mode never seeks back, the archive is written strictly front to back
+            self._zip = None
+            self._tar = tarfile.open(fileobj=self._file, mode=mode, bufsize=buffer_size)
+
+    @staticmethod
+    def _member_name(file_path: str) -> str:
+        return os.path.normpath(file_path).replace(os.sep, '/').lstrip('/')
+
+    def _write(self, member_name: str, data: bytes) -> None:
+        if self._zip is not None:
+            self._zip.writestr(zipfile.ZipInfo(member_name, time.localtime()[:6]), data, compress_type=self._zip.compression)
+        else:
+            info = tarfile.TarInfo(member_name)
+            info.size = len(data)
+            info.mtime = int(time.time())
+            self._tar.addfile(info, io.BytesIO(data))
+        self._members.add(member_name)
+
+    def save(self, formatted_data: str, file_path: str) -> bool:
+        """Add the formatted data to the archive.
+
+        Args:
+            formatted_data (str): The formatted data to save.
+            file_path (str): The path of the file within the archive.
+
+        Returns:
+            bool: True if the data was added, False if writing failed.
+        """
+        try:
+            with self._lock:
+                self._write(self._member_name(file_path), formatted_data.encode('utf-8'))
+            logger.info(f"Chat has been formatted and saved as {file_path} in {self.archive_path}")
+            return True
+        except Exception as e:
+            logger.error(f"Failed to add {file_path} to {self.archive_path}: {e}")
+        return False
+
+    def make_dirs(self, dir_path: str) -> None:
+        """Directories are implied by the member names of an archive."""
+        pass
+
+    def exists(self, file_path: str) -> bool:
+        """Check whether a file was already added to the archive."""
+        with self._lock:
+            return self._member_name(file_path) in self._members
+
+    def read(self, file_path: str) -> str | None:
+        """Files are never read back from an archive that is being written."""
+        return None
+
+    def save_file(self, source_path: str, file_path: str) -> None:
+        """Add a copy of an existing file to the archive."""
+        member_name = self._member_name(file_path)
+        with self._lock:
+            if self._zip is not None:
+                self._zip.write(source_path, member_name)
+            else:
+                self._tar.add(source_path, member_name)
+            self._members.add(member_name)
+
+    def add_contents(self, file_path: str, title: str | None) -> None:
+        """Record a saved chat for the table of contents."""
+        self._contents.append((self._member_name(file_path), title))
+
+    def _table_of_contents(self) -> str:
+        lines = ["# Table of Contents"]
+        section = None
+        for member_name, title in sorted(self._contents, key=lambda entry: self._sort_key(entry[0])):
+            folder, file_name = os.path.split(member_name)
+            if folder != section or len(lines) == 1:
+                section = folder
+                lines.extend(["", f"## {folder}", ""] if folder else [""])
+            label = os.path.splitext(file_name)[0].replace('_', ' ').capitalize()
+            if title:
+                label = f"{label}: {title}"
+            lines.append(f"- [{label}]({member_name.replace(' ', '%20')})")
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _sort_key(member_name: str) -> tuple[str, int, str]:
+        # tab_10 comes after tab_9
+        folder, file_name = os.path.split(member_name)
+        number = re.search(r'(\d+)', file_name)
+        return folder, int(number.group(1)) if number else 0, file_name
+
+    def close(self) -> None:
+        """Add the table of contents and finish the archive."""
+        with self._lock:
+            if self._file.closed:
+                return
+            try:
+                if self._contents:
+                    self._write(self.CONTENTS_NAME, self._table_of_contents().encode('utf-8'))
+                if self._zip is not None:
+                    self._zip.close()
+                else:
+                    self._tar.close()
+                logger.info(f"Archive written to {self.archive_path} with {len(self._members)} files")
+            finally:
+                self._file.close()
+
+class ExportManifest:
+    FILE_NAME = '.manifest.json'
+
+    def __init__(self, output_dir: str) -> None:
+        """Load the manifest of an output directory, or start an empty one.
+
+        The manifest remembers which database was exported to the directory, its version as given by
+        `db_version`, which tabs were selected and a content hash of each exported tab.
+
+        Args:
+            output_dir (str): The directory where the formatted data is saved.
+        """
+        self.path = os.path.join(output_dir, self.FILE_NAME)
+        self.db_path: str | None = None
+        self.db_version: tuple[int, ...] | None = None
+        self.selection: str | None = None
+        self.tabs: dict[str, str] = {}
+
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r') as file:
+                    manifest = json.load(file)
+                self.db_path = manifest.get('db_path')
+                db_version = manifest.get('db_version')
+                self.db_version = tuple(db_version) if db_version is not None else None
+                self.selection = manifest.get('selection')
+                self.tabs = manifest.get('tabs', {})
+            except (IOError, json.JSONDecodeError) as e:
+                logger.warning(f"Ignoring unreadable export manifest {self.path}: {e}")
+
+    @staticmethod
+    def tab_hash(tab: Tab) -> str:
+        """Hash the content of a tab that ends up in its export."""
+        content = [(bubble.role, bubble.model_type, bubble.text, bubble.selections, bubble.image_path) for bubble in tab.bubbles]
+        return hashlib.sha256(json.dumps(content).encode('utf-8')).hexdigest()
+
+    def is_current(self, db_path: str, db_version: tuple[int, ...] | None, selection: str) -> bool:
+        """Check whether the same tabs of the same, unchanged database were already exported and their files are still there."""
+        if db_version is None or (self.db_path, self.db_version, self.selection) != (db_path, db_version, selection) or not self.tabs:
+            return False
+        output_dir = os.path.dirname(self.path)
+        return all(os.path.isfile(os.path.join(output_dir, f"{tab_name}.md")) for tab_name in self.tabs)
+
+    def update_source(self, db_path: str, db_version: tuple[int, ...] | None, selection: str) -> None:
+        """Record the database the tabs were exported from, and its version before it was read."""
+        self.db_path, self.db_version, self.selection = db_path, db_version, selection
+
+    def save(self) -> None:
+        """Write the manifest to the output directory."""
+        manifest = {'db_path': self.db_path, 'db_version': self.db_version, 'selection': self.selection, 'tabs': self.tabs}
+        write_json(self.path, manifest)
 
 class ChatExporter:
-    def __init__(self, formatter: ChatFormatter, saver: FileSaver) -> None:
+    def __init__(self, formatter: ChatFormatter, saver: FileSaver, profiler: Profiler | None = None) -> None:
         """Initialize the ChatExporter with a formatter and a saver.
 
         Args:
             formatter (ChatFormatter): The formatter to format the chat data.
             saver (FileSaver): The saver to save the formatted data.
+            profiler (Profiler | None): The profiler recording the time spent decoding, comparing and saving tabs.
         """
         self.formatter = formatter
         self.saver = saver
+        self.profiler = profiler
 
-    def export(self, chat_data: dict[str, Any], output_dir: str, image_dir: str, tab_ids: list[int] | None = None) -> None:
+    def export(self, chat_data: ChatData, output_dir: str, image_dir: str, tab_ids: list[int] | None = None, manifest: ExportManifest | None = None) -> dict[str, int]:
         """Export the chat data by formatting and saving it.
 
+        Only files whose content differs are written. With a manifest, tabs whose content hash did not
+        change since the last export are not even formatted, and the manifest is updated with the new hashes.
+        The hash of a tab that could not be saved, or whose images could not be stored, is dropped from the
+        manifest, so it is exported again next time.
+
         Args:
-            chat_data (dict[str, Any]): The chat data to export.
+            chat_data (ChatData): The chat data to export, either decoded as a whole or as an iterator of (tab index, tab) pairs.
             output_dir (str): The directory where the formatted data will be saved.
             image_dir (str): The directory where images will be saved.
+            tab_ids (list[int]): List of tab indices to include exclusively.
+            manifest (ExportManifest | None): The manifest of the output directory.
+
+        Returns:
+            dict[str, int]: The number of 'skipped', 'rewritten', 'added' and 'failed' tabs. A failure that
+                stopped the export altogether counts as one failed tab.
         """
+        stats = {"skipped": 0, "rewritten": 0, "added": 0, "failed": 0}
+        # The count each formatted tab went to, moved to 'failed' if its images turn out not to be stored
+        outcomes: dict[int, str] = {}
         try:
-            os.makedirs(output_dir, exist_ok=True)
-            formatted_chats = self.formatter.format(chat_data, image_dir, tab_ids=tab_ids)
-            if formatted_chats is not None:
-                for tab_name, formatted_data in formatted_chats.items():
-                    tab_file_path = os.path.join(output_dir, f"{tab_name}.md")
-                    self.saver.save(formatted_data, tab_file_path)
+            self.saver.make_dirs(output_dir)
+            tabs = ChatFormatter._iter_tabs(chat_data, tab_ids)
+            if self.profiler is not None:
+                # Streamed tabs are decoded while they are iterated
+                tabs = self.profiler.iterate("decode", tabs)
+            for tab_index, tab in tabs:
+                tab_name = f"tab_{tab_index + 1}"
+                tab_file_path = os.path.join(output_dir, f"{tab_name}.md")
+                with profile_stage(self.profiler, "manifest"):
+                    tab_hash = ExportManifest.tab_hash(tab) if manifest is not None else None
+
+                file_exists = self.saver.exists(tab_file_path)
+                if manifest is not None and file_exists and manifest.tabs.get(tab_name) == tab_hash:
+                    stats["skipped"] += 1
+                    continue
+
+                formatted_chats = self.formatter.format([(tab_index, tab)], image_dir)
+                if formatted_chats is None:
+                    # The formatter already logged why; the tab is exported again next time
+                    stats["failed"] += 1
+                    if manifest is not None:
+                        manifest.tabs.pop(tab_name, None)
+                    continue
+                saved = True
+                for formatted_data in formatted_chats.values():
+                    with profile_stage(self.profiler, "compare"):
+                        unchanged = file_exists and self.saver.read(tab_file_path) == formatted_data
+                    if unchanged:
+                        outcome = "skipped"
+                    else:
+                        with profile_stage(self.profiler, "save") as measured:
+                            saved = self.saver.save(formatted_data, tab_file_path)
+                            measured["bytes"] = len(formatted_data)
+                        if not saved:
+                            stats["failed"] += 1
+                            continue
+                        outcome = "rewritten" if file_exists else "added"
+                    stats[outcome] += 1
+                    outcomes[tab_index] = outcome
+                    self.saver.add_contents(tab_file_path, tab.title)
+                if manifest is not None:
+                    if saved:
+                        manifest.tabs[tab_name] = tab_hash
+                    else:
+                        manifest.tabs.pop(tab_name, None)
+        except json.JSONDecodeError:
+            raise
         except Exception as e:
             logger.error(f"Failed to export chat data: {e}")
+            stats["failed"] += 1
+        finally:
+            for tab_index in self.formatter.close():
+                if tab_index in outcomes:
+                    stats[outcomes[tab_index]] -= 1
+                    stats["failed"] += 1
+                if manifest is not None:
+                    manifest.tabs.pop(f"tab_{tab_index + 1}", None)
+        return stats
 
 # Example usage:
 # Load the chat data from the JSON file
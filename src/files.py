@@ -0,0 +1,25 @@
+import os
+import json
+import threading
+from typing import Any
+
+def write_json(file_path: str, data: Any) -> None:
+    """Write data as JSON to a file, replacing it atomically.
+
+    The data is written to a temporary file in the same directory first and then renamed over the file,
+    so an interrupted write or a concurrent reader never sees a truncated file.
+
+    Args:
+        file_path (str): The path to the JSON file.
+        data (Any): The data to write.
+    """
+    # Named after the process and thread, so concurrent writers never share it; created like `open` would, honoring the umask
+    tmp_path = os.path.join(os.path.dirname(file_path), f".{os.path.basename(file_path)}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with open(tmp_path, 'w') as file:
+            json.dump(data, file, indent=2)
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
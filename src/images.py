@@ -0,0 +1,153 @@
+import os
+import shutil
+import hashlib
+import tempfile
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any
+from loguru import logger
+from src.profiling import Profiler, profile_stage
+
+if TYPE_CHECKING:
+    from src.export import FileSaver
+
+class ImageStore:
+    def __init__(self, image_dir: str, max_workers: int = 4, profiler: Profiler | None = None, saver: "FileSaver | None" = None) -> None:
+        """
+        Initialize the ImageStore, which collects the images of an export in a single folder.
+
+        Images are stored under the hash of their content, so an image referenced by several tabs
+        or exported again by a later run is only stored once. The files are hashed and then copied on
+        a thread pool while the caller goes on formatting; `close` waits for them.
+
+        Args:
+            image_dir (str): The directory where the images are stored.
+            max_workers (int): The number of threads hashing and copying the images.
+            profiler (Profiler | None): The profiler recording the time spent hashing, copying and waiting for images.
+            saver (FileSaver | None): The saver the images are stored through, such as an archive, instead of the file system.
+        """
+        self.image_dir = image_dir
+        self.max_workers = max_workers
+        self.profiler = profiler
+        self.saver = saver
+        self._hashes: dict[tuple[str, int, int], str] = {}
+        self._names: dict[tuple[str, int, int], Future] = {}
+        self._pending: dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._executor: ThreadPoolExecutor | None = None
+
+    def __enter__(self) -> "ImageStore":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    @staticmethod
+    def _hash_file(image_path: str) -> str:
+        digest = hashlib.sha256()
+        with open(image_path, 'rb') as file:
+            for block in iter(lambda: file.read(1 << 20), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def _store(self, image_path: str, stored_path: str, db_path: str | None) -> None:
+        with profile_stage(self.profiler, "images.copy", db_path) as measured:
+            measured["bytes"] = os.path.getsize(image_path)
+            if self.saver is not None:
+                self.saver.save_file(image_path, stored_path)
+            else:
+                self._link_or_copy(image_path, stored_path)
+
+    def _hash_and_store(self, image_path: str, key: tuple[str, int, int], db_path: str | None) -> str:
+        name = self._hashes.get(key)
+        if name is None:
+            extension = os.path.splitext(image_path)[1].lower()
+            with profile_stage(self.profiler, "images.hash", db_path) as measured:
+                measured["bytes"] = key[1]
+                name = f"{self._hash_file(image_path)}{extension}"
+            self._hashes[key] = name
+
+        stored_path = os.path.join(self.image_dir, name)
+        with self._lock:
+            if name in self._pending:
+                return name
+            stored = self.saver.exists(stored_path) if self.saver is not None else os.path.exists(stored_path)
+            if not stored:
+                if self.saver is not None:
+                    self.saver.make_dirs(self.image_dir)
+                else:
+                    os.makedirs(self.image_dir, exist_ok=True)
+                # Queued behind the other hashes, so this thread is free to hash the next image
+                self._pending[name] = self._executor.submit(self._store, image_path, stored_path, db_path)
+        return name
+
+    def _link_or_copy(self, image_path: str, stored_path: str) -> None:
+        # Hardlink if possible, else copy to a temporary file first so an interrupted copy never looks complete
+        try:
+            os.link(image_path, stored_path)
+            return
+        except OSError:
+            pass
+        fd, tmp_path = tempfile.mkstemp(dir=self.image_dir, prefix='.tmp_')
+        os.close(fd)
+        try:
+            shutil.copyfile(image_path, tmp_path)
+            os.replace(tmp_path, stored_path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def add(self, image_path: str) -> Future:
+        """Schedule an image to be hashed and stored.
+
+        Args:
+            image_path (str): The path to the image file.
+
+        Returns:
+            Future: Resolves to the name the image is stored under, see `link`, or raises if the image could not be read.
+        """
+        stat = os.stat(image_path)
+        key = (image_path, stat.st_size, stat.st_mtime_ns)
+        future = self._names.get(key)
+        if future is None:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='image-store')
+            # Hashes and copies run in other threads, so the database they belong to is passed along
+            db_path = self.profiler.current_db if self.profiler is not None else None
+            future = self._executor.submit(self._hash_and_store, image_path, key, db_path)
+            self._names[key] = future
+        return future
+
+    def link(self, name: str) -> str:
+        """Get the path of a stored image relative to the parent of the image directory."""
+        return f"{os.path.basename(self.image_dir)}/{name}"
+
+    def close(self) -> set[str]:
+        """Wait until all scheduled images are stored.
+
+        Returns:
+            set[str]: The links, as given by `link`, of the images that could not be stored.
+        """
+        failed = set()
+        with profile_stage(self.profiler, "images.wait"):
+            # Every store is submitted by a hash, so once the hashes are done no store is added any more
+            for future in self._names.values():
+                try:
+                    future.result()
+                except Exception:
+                    pass
+            for name, future in self._pending.items():
+                try:
+                    future.result()
+                except Exception as e:
+                    logger.error(f"Failed to store image {name}: {e}")
+                    failed.add(self.link(name))
+        stored = len(self._pending) - len(failed)
+        self._names.clear()
+        self._pending.clear()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        if stored:
+            logger.info(f"Stored {stored} new images in {self.image_dir}")
+        return failed
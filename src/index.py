@@ -0,0 +1,219 @@
+import os
+import json
+import sqlite3
+from typing import Any
+from loguru import logger
+from src.vscdb import VSCDBQuery, db_version
+from src.export import MarkdownChatFormatter
+from src.chatdata import iter_tabs
+from src.pool import pool_map
+
+PREVIEW_LINES = 10
+
+# Bumped whenever what is stored changes, so indexes built by older versions are rebuilt
+SCHEMA_VERSION = 3
+
+# The trigram tokenizer makes MATCH behave like a case-insensitive substring search,
+# which is what `discover --search-text` always did.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS databases (
+    db_path TEXT PRIMARY KEY,
+    mtime REAL NOT NULL,
+    version TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tabs (
+    db_path TEXT NOT NULL,
+    tab_index INTEGER NOT NULL,
+    preview TEXT NOT NULL,
+    PRIMARY KEY (db_path, tab_index)
+);
+CREATE TABLE IF NOT EXISTS bubbles (
+    id INTEGER PRIMARY KEY,
+    db_path TEXT NOT NULL,
+    tab_index INTEGER NOT NULL,
+    bubble_index INTEGER NOT NULL,
+    role TEXT NOT NULL,
+    text TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS bubbles_db_path ON bubbles (db_path);
+CREATE VIRTUAL TABLE IF NOT EXISTS bubbles_fts USING fts5(
+    text, content='bubbles', content_rowid='id', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS bubbles_ai AFTER INSERT ON bubbles BEGIN
+    INSERT INTO bubbles_fts (rowid, text) VALUES (new.id, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS bubbles_ad AFTER DELETE ON bubbles BEGIN
+    INSERT INTO bubbles_fts (bubbles_fts, rowid, text) VALUES ('delete', old.id, old.text);
+END;
+"""
+
+DROP_SCHEMA = """
+DROP TRIGGER IF EXISTS bubbles_ai;
+DROP TRIGGER IF EXISTS bubbles_ad;
+DROP TABLE IF EXISTS bubbles_fts;
+DROP TABLE IF EXISTS bubbles;
+DROP TABLE IF EXISTS tabs;
+DROP TABLE IF EXISTS databases;
+"""
+
+def extract_db(db_path: str) -> dict[str, Any] | None:
+    """Read a database and extract what the index stores about it.
+
+    This is a module-level function so it can be shipped to worker processes.
+
+    Args:
+        db_path (str): The path to the state.vscdb file.
+
+    Returns:
+        dict[str, Any] | None: The tab previews and the Markdown of each tab title and bubble, or None if the database could not be read.
+    """
+    db_query = VSCDBQuery(db_path)
+    chat_data = db_query.query_aichat_data()
+
+    if "error" in chat_data:
+        logger.error(f"Error querying chat data from {db_path}: {chat_data['error']}")
+        return None
+    if not chat_data:
+        return {"tabs": [], "bubbles": []}
+
+    formatter = MarkdownChatFormatter()
+    tabs = []
+    bubbles = []
+    try:
+        for tab_index, tab in iter_tabs(chat_data[0]):
+            tabs.append((tab_index, formatter.preview(tab_index, tab, max_lines=PREVIEW_LINES)))
+
+            # The Markdown is indexed rather than the raw text, so the index finds exactly what scanning the
+            # formatted transcripts finds: the tab title, the role headings and the rewritten code blocks.
+            # The search text never spans lines, so a chunk matches whenever one of its lines does.
+            for chunk_index, chunk in enumerate(formatter.iter_tab(tab_index, tab, None)):
+                bubbles.append((tab_index, chunk_index, 'title' if chunk_index == 0 else 'bubble', chunk))
+    except json.JSONDecodeError as e:
+        logger.error(f"JSON decode error in {db_path}: {e}")
+        return None
+    except Exception as e:
+        logger.error(f"Failed to format chat data from {db_path}: {e}")
+        return None
+
+    return {"tabs": tabs, "bubbles": bubbles}
+
+class ChatIndex:
+    def __init__(self, index_path: str) -> None:
+        """
+        Initialize the ChatIndex, creating the index database if needed.
+
+        Args:
+            index_path (str): The path to the SQLite file holding the full-text index.
+        """
+        self.index_path = index_path
+        os.makedirs(os.path.dirname(index_path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(index_path)
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            logger.info(f"Rebuilding chat index {index_path} for schema version {SCHEMA_VERSION}")
+            self.conn.executescript(DROP_SCHEMA)
+            self.conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self.conn.executescript(SCHEMA)
+        logger.debug(f"Opened chat index at {index_path}")
+
+    def close(self) -> None:
+        """Close the underlying index database."""
+        self.conn.close()
+
+    def __enter__(self) -> "ChatIndex":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def _remove(self, db_path: str) -> None:
+        self.conn.execute("DELETE FROM bubbles WHERE db_path = ?", (db_path,))
+        self.conn.execute("DELETE FROM tabs WHERE db_path = ?", (db_path,))
+        self.conn.execute("DELETE FROM databases WHERE db_path = ?", (db_path,))
+
+    def _store(self, db_path: str, mtime: float, version: str, extracted: dict[str, Any]) -> None:
+        with self.conn:
+            self._remove(db_path)
+            self.conn.executemany(
+                "INSERT INTO tabs (db_path, tab_index, preview) VALUES (?, ?, ?)",
+                ((db_path, tab_index, preview) for tab_index, preview in extracted["tabs"]),
+            )
+            self.conn.executemany(
+                "INSERT INTO bubbles (db_path, tab_index, bubble_index, role, text) VALUES (?, ?, ?, ?, ?)",
+                ((db_path, *bubble) for bubble in extracted["bubbles"]),
+            )
+            self.conn.execute("INSERT INTO databases (db_path, mtime, version) VALUES (?, ?, ?)", (db_path, mtime, version))
+
+    def refresh(self, state_files: list[tuple[str, float]], jobs: int = 1, rebuild: bool = False) -> dict[str, int]:
+        """Bring the index up to date for the given databases.
+
+        Only databases whose version, as given by `db_version`, differs from the indexed one are read again,
+        so commits that only reached the write-ahead log are picked up too. Indexed databases that no longer
+        exist on disk are dropped.
+
+        Args:
+            state_files (list[tuple[str, float]]): The database paths and their modification times.
+            jobs (int): The number of worker processes used to read the changed databases.
+            rebuild (bool): Re-read every database even if it did not change.
+
+        Returns:
+            dict[str, int]: The number of 'updated', 'unchanged', 'failed' and 'removed' databases.
+        """
+        indexed = dict(self.conn.execute("SELECT db_path, version FROM databases"))
+        # Versions are taken before reading, so a commit landing meanwhile is picked up by the next refresh
+        versions = {db_path: json.dumps(db_version(db_path)) for db_path, _ in state_files}
+        mtimes = {db_path: mtime for db_path, mtime in state_files if rebuild or indexed.get(db_path) != versions[db_path]}
+        stats = {"updated": 0, "unchanged": len(state_files) - len(mtimes), "failed": 0, "removed": 0}
+
+        for db_path, extracted in pool_map(extract_db, list(mtimes), jobs=jobs):
+            if extracted is None:
+                stats["failed"] += 1
+                continue
+            self._store(db_path, mtimes[db_path], versions[db_path], extracted)
+            stats["updated"] += 1
+
+        with self.conn:
+            for db_path in indexed:
+                if not os.path.exists(db_path):
+                    self._remove(db_path)
+                    stats["removed"] += 1
+
+        logger.info(f"Chat index refreshed: {stats}")
+        return stats
+
+    def search(self, search_text: str, db_paths: list[str] | None = None) -> list[tuple[str, int, str]]:
+        """Find the tabs having a bubble that contains the search text (case-insensitive).
+
+        Args:
+            search_text (str): The text to search for.
+            db_paths (list[str] | None): Restrict the search to these databases.
+
+        Returns:
+            list[tuple[str, int, str]]: The database path, tab index and preview of each matching tab,
+                newest database first.
+        """
+        if len(search_text) >= 3:
+            # A quoted FTS5 string is matched as a substring by the trigram tokenizer
+            condition = "bubbles.id IN (SELECT rowid FROM bubbles_fts WHERE bubbles_fts MATCH ?)"
+            parameter = '"' + search_text.replace('"', '""') + '"'
+        else:
+            # Trigrams cannot serve patterns shorter than 3 characters
+            condition = "bubbles.text LIKE ? ESCAPE '\\'"
+            escaped = search_text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            parameter = f"%{escaped}%"
+
+        rows = self.conn.execute(
+            f"""
+            SELECT DISTINCT tabs.db_path, tabs.tab_index, tabs.preview, databases.mtime
+            FROM bubbles
+            JOIN tabs ON tabs.db_path = bubbles.db_path AND tabs.tab_index = bubbles.tab_index
+            JOIN databases ON databases.db_path = bubbles.db_path
+            WHERE {condition}
+            ORDER BY databases.mtime DESC, tabs.tab_index
+            """,
+            (parameter,),
+        ).fetchall()
+
+        if db_paths is not None:
+            allowed = set(db_paths)
+            rows = [row for row in rows if row[0] in allowed]
+        return [(db_path, tab_index, preview) for db_path, tab_index, preview, _ in rows]
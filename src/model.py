@@ -0,0 +1,120 @@
+import sys
+import json
+from typing import Any
+from loguru import logger
+
+# Shown instead of the text of a user bubble whose text could not be found
+MISSING_USER_TEXT = "[ERROR: no user text found]"
+
+def _user_text(bubble: dict[str, Any]) -> str:
+    # Cursor kept the text of user bubbles in different fields over time
+    try:
+        if "delegate" in bubble:
+            return bubble['delegate']["a"] if bubble["delegate"] else ""
+        if "text" in bubble:
+            return bubble['text'] or ""
+        if "initText" in bubble:
+            if not bubble["initText"]:
+                return ""
+            try:
+                return json.loads(bubble["initText"])['root']['children'][0]['children'][0]['text']
+            except Exception as e:
+                logger.error(f"Couldn't find user text entry in one of the bubbles. Error: {e}")
+                logger.debug(f"Bubble:\n{json.dumps(bubble, indent=4)}")
+                return MISSING_USER_TEXT
+        if "rawText" in bubble:
+            return bubble['rawText'] or ""
+        logger.error(f"Couldn't find user text entry in one of the bubbles.")
+        logger.debug(f"Bubble:\n{json.dumps(bubble, indent=4)}")
+    except Exception as e:
+        logger.error(f"Couldn't find user text entry in one of the bubbles. Error: {e}")
+        logger.debug(f"Bubble:\n{json.dumps(bubble, indent=4)}")
+    return MISSING_USER_TEXT
+
+class Bubble:
+    __slots__ = ('role', 'text', 'selections', 'image_path', 'model_type', 'timestamp')
+
+    def __init__(
+        self,
+        role: str,
+        text: str,
+        selections: tuple[str, ...] = (),
+        image_path: str | None = None,
+        model_type: str | None = None,
+        timestamp: int | None = None,
+    ) -> None:
+        """A message of a chat, keeping only what the formatters use.
+
+        Args:
+            role (str): 'user' or 'ai'. Bubbles of other types are kept but not formatted.
+            text (str): The text the user typed, or the raw answer of the AI.
+            selections (tuple[str, ...]): The code the user selected and sent along.
+            image_path (str | None): The image the user attached.
+            model_type (str | None): The model that answered, for AI bubbles.
+            timestamp (int | None): When the bubble was sent, in milliseconds, if Cursor recorded it.
+        """
+        self.role = role
+        self.text = text
+        self.selections = selections
+        self.image_path = image_path
+        self.model_type = model_type
+        self.timestamp = timestamp
+
+    @classmethod
+    def from_dict(cls, bubble: dict[str, Any]) -> "Bubble":
+        """Build a bubble from its decoded JSON, extracting the user text once.
+
+        Roles and model types are interned, since the same few values repeat in every bubble.
+        """
+        role = sys.intern(str(bubble.get('type')))
+        if role == 'user':
+            image = bubble.get('image')
+            return cls(
+                role,
+                _user_text(bubble),
+                selections=tuple(selection.get("text", "") for selection in bubble.get("selections") or ()),
+                image_path=image.get('path') if image else None,
+                timestamp=bubble.get('timestamp'),
+            )
+        model_type = bubble.get('modelType', 'Unknown') if role == 'ai' else None
+        return cls(
+            role,
+            bubble.get('rawText') or "",
+            model_type=sys.intern(model_type) if isinstance(model_type, str) else model_type,
+            timestamp=bubble.get('timestamp'),
+        )
+
+    def to_dict(self) -> dict[str, Any]:
+        """Return the fields of the bubble as a JSON-compatible dictionary."""
+        return {
+            "role": self.role,
+            "model_type": self.model_type,
+            "text": self.text,
+            "selections": list(self.selections),
+            "image_path": self.image_path,
+            "timestamp": self.timestamp,
+        }
+
+class Tab:
+    __slots__ = ('title', 'timestamp', 'bubbles')
+
+    def __init__(self, title: str | None, timestamp: int | None, bubbles: list[Bubble]) -> None:
+        """A chat tab.
+
+        Args:
+            title (str | None): The title Cursor gave the chat.
+            timestamp (int | None): When the chat was last used, in milliseconds.
+            bubbles (list[Bubble]): The messages of the chat.
+        """
+        self.title = title
+        self.timestamp = timestamp
+        self.bubbles = bubbles
+
+    @classmethod
+    def from_dict(cls, tab: dict[str, Any]) -> "Tab":
+        """Build a tab from its decoded JSON."""
+        return cls(tab.get('chatTitle'), tab.get('timestamp'), [Bubble.from_dict(bubble) for bubble in tab.get('bubbles', [])])
+
+    def to_dict(self) -> dict[str, Any]:
+        """Return the fields of the tab as a JSON-compatible dictionary."""
+        return {"title": self.title, "timestamp": self.timestamp, "bubbles": [bubble.to_dict() for bubble in self.bubbles]}
@@ -0,0 +1,30 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Iterator, TypeVar
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+def pool_map(function: Callable[..., R], items: list[T], *arguments: Any, jobs: int = 1) -> Iterator[tuple[T, R]]:
+    """Call a function on each item, optionally on a process pool.
+
+    Results are yielded in the order of `items` as soon as they are available. The function and the
+    arguments are shipped to the worker processes, so they must be picklable: the function is module-level.
+
+    Args:
+        function (Callable[..., R]): The function, called as `function(item, *arguments)`.
+        items (list[T]): The items, such as database paths.
+        *arguments (Any): The arguments passed to every call after the item.
+        jobs (int): The number of worker processes. 1 runs everything in this process.
+
+    Yields:
+        tuple[T, R]: The item and its result.
+    """
+    if jobs <= 1 or len(items) <= 1:
+        for item in items:
+            yield item, function(item, *arguments)
+        return
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        # `map` keeps the input order while workers run ahead
+        results = executor.map(function, items, *([argument] * len(items) for argument in arguments))
+        yield from zip(items, results)
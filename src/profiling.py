@@ -0,0 +1,174 @@
+import json
+import time
+import threading
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from typing import TYPE_CHECKING, Any, ContextManager, Iterable, Iterator, TypeVar
+
+if TYPE_CHECKING:
+    from rich.table import Table
+
+T = TypeVar('T')
+
+class Profiler:
+    def __init__(self, trace_memory: bool = False) -> None:
+        """
+        Initialize the Profiler, which accumulates wall time, bytes and peak memory per stage and per database.
+
+        Stages are recorded by the `VSCDBQuery`, `MarkdownChatFormatter`, `ImageStore` and `ChatExporter`
+        hooks when a profiler is passed to them. Peak memory is traced with `tracemalloc` in the main
+        thread only, since it cannot be attributed to a stage running concurrently in another thread.
+        Tracing slows every Python allocation down and inflates the wall times, so it is off by default
+        and best done in a separate run.
+
+        Args:
+            trace_memory (bool): Trace the peak memory of each stage.
+        """
+        self.trace_memory = trace_memory
+        self.records: dict[tuple[str, str | None], dict[str, Any]] = {}
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def _stack(self) -> list[list[int]]:
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    @property
+    def current_db(self) -> str | None:
+        return getattr(self._local, 'db_path', None)
+
+    @contextmanager
+    def database(self, db_path: str) -> Iterator[None]:
+        """Attribute the stages recorded in this thread to a database."""
+        previous = self.current_db
+        self._local.db_path = db_path
+        try:
+            yield
+        finally:
+            self._local.db_path = previous
+
+    def add(self, stage: str, seconds: float, size: int = 0, peak_memory: int | None = None, db_path: str | None = None, calls: int = 1) -> None:
+        """Add a measurement to a stage."""
+        key = (stage, db_path if db_path is not None else self.current_db)
+        with self._lock:
+            record = self.records.setdefault(key, {"calls": 0, "seconds": 0.0, "bytes": 0, "peak_memory_bytes": None})
+            record["calls"] += calls
+            record["seconds"] += seconds
+            record["bytes"] += size
+            if peak_memory is not None:
+                record["peak_memory_bytes"] = max(record["peak_memory_bytes"] or 0, peak_memory)
+
+    @contextmanager
+    def stage(self, stage: str, db_path: str | None = None) -> Iterator[dict[str, int]]:
+        """Measure a block of code.
+
+        Yields:
+            dict[str, int]: A mutable record whose 'bytes' the block can set.
+        """
+        measure_memory = self.trace_memory and tracemalloc.is_tracing() and threading.current_thread() is threading.main_thread()
+        stack = self._stack()
+        if measure_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if stack:
+                # The peak is about to be reset, keep what the enclosing stage has seen so far
+                stack[-1][1] = max(stack[-1][1], peak)
+            tracemalloc.reset_peak()
+            stack.append([current, 0])
+
+        measured = {"bytes": 0}
+        start = time.perf_counter()
+        try:
+            yield measured
+        finally:
+            seconds = time.perf_counter() - start
+            peak_memory = None
+            if measure_memory:
+                start_memory, inner_peak = stack.pop()
+                _, peak = tracemalloc.get_traced_memory()
+                peak = max(peak, inner_peak)
+                peak_memory = peak - start_memory
+                if stack:
+                    stack[-1][1] = max(stack[-1][1], peak)
+            self.add(stage, seconds, measured["bytes"], peak_memory, db_path)
+
+    def iterate(self, stage: str, iterable: Iterable[T]) -> Iterator[T]:
+        """Measure the time spent producing each item of an iterator, such as tabs decoded on demand."""
+        iterator = iter(iterable)
+        while True:
+            with self.stage(stage):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def merge(self, records: list[dict[str, Any]]) -> None:
+        """Add the records of a profiler that ran in another process, as returned by `to_records`."""
+        for record in records:
+            self.add(record["stage"], record["seconds"], record["bytes"], record["peak_memory_bytes"], record["db_path"], record["calls"])
+
+    def to_records(self) -> list[dict[str, Any]]:
+        """Return the measurements of each stage and database."""
+        with self._lock:
+            return [{"stage": stage, "db_path": db_path, **record} for (stage, db_path), record in self.records.items()]
+
+    def stages(self) -> list[dict[str, Any]]:
+        """Return the measurements of each stage summed over the databases, in the order they were first recorded."""
+        totals: dict[str, dict[str, Any]] = {}
+        for record in self.to_records():
+            total = totals.setdefault(record["stage"], {"stage": record["stage"], "calls": 0, "seconds": 0.0, "bytes": 0, "peak_memory_bytes": None, "databases": 0})
+            total["calls"] += record["calls"]
+            total["seconds"] += record["seconds"]
+            total["bytes"] += record["bytes"]
+            if record["db_path"] is not None:
+                total["databases"] += 1
+            if record["peak_memory_bytes"] is not None:
+                total["peak_memory_bytes"] = max(total["peak_memory_bytes"] or 0, record["peak_memory_bytes"])
+        return list(totals.values())
+
+    def summary_table(self) -> "Table":
+        """Build a table of the time, bytes and peak memory of each stage."""
+        from rich.table import Table
+
+        wall = time.perf_counter() - self.started
+        table = Table(title=f"Profile ({wall:.3f} s wall time)")
+        table.add_column("stage", no_wrap=True)
+        for column in ("databases", "calls", "time", "% wall", "bytes", "peak memory"):
+            table.add_column(column, justify="right")
+        for total in self.stages():
+            peak = total["peak_memory_bytes"]
+            table.add_row(
+                total["stage"],
+                str(total["databases"]),
+                str(total["calls"]),
+                f"{total['seconds']:.3f} s",
+                f"{100 * total['seconds'] / wall:.1f}",
+                f"{total['bytes'] / 1e6:.2f} MB",
+                f"{peak / 1e6:.2f} MB" if peak is not None else "-",
+            )
+        return table
+
+    def save_json(self, file_path: str) -> None:
+        """Write the per-stage and per-database measurements to a JSON file."""
+        report = {
+            "wall_seconds": time.perf_counter() - self.started,
+            "stages": self.stages(),
+            "databases": [record for record in self.to_records() if record["db_path"] is not None],
+        }
+        with open(file_path, 'w') as file:
+            json.dump(report, file, indent=2)
+
+    def stop(self) -> None:
+        """Stop tracing memory."""
+        if self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+def profile_stage(profiler: Profiler | None, stage: str, db_path: str | None = None) -> ContextManager[dict[str, int]]:
+    """Measure a block of code if a profiler is given, else do nothing."""
+    if profiler is None:
+        return nullcontext({"bytes": 0})
+    return profiler.stage(stage, db_path)
@@ -0,0 +1,136 @@
+import os
+import shlex
+import subprocess
+from contextlib import contextmanager
+from typing import IO, TYPE_CHECKING, Iterable, Iterator
+from loguru import logger
+from src.export import MarkdownChatFormatter
+from src.model import Tab
+from src.profiling import Profiler, profile_stage
+
+if TYPE_CHECKING:
+    from rich.console import Console
+
+DEFAULT_PAGER = 'less'
+
+class ConsoleRenderer:
+    def __init__(self, console: "Console", pager: bool = False, profiler: Profiler | None = None) -> None:
+        """
+        Initialize the ConsoleRenderer, which prints tabs to the command line one bubble at a time.
+
+        Each bubble is rendered and flushed as soon as it is formatted, so the first lines show up
+        right away and only one bubble is held in memory. With a pager, the output is piped into
+        `$PAGER` (`less` by default). The pipe holds at most a few pages the pager did not read yet:
+        once it is full, formatting waits until the user scrolls further.
+
+        Args:
+            console (Console): The console to print to, or whose size and colors the pager output uses.
+            pager (bool): Pipe the output into a pager. Ignored if the console is not a terminal.
+            profiler (Profiler | None): The profiler recording the time spent rendering.
+        """
+        self.console = console
+        self.pager = pager
+        self.profiler = profiler
+
+    @staticmethod
+    def _pager_command() -> list[str]:
+        return shlex.split(os.environ.get('PAGER') or DEFAULT_PAGER)
+
+    @contextmanager
+    def _open(self) -> Iterator["Console"]:
+        if not self.pager or not self.console.is_terminal:
+            yield self.console
+            return
+
+        # Like git, let less pass colors through, quit on output fitting one screen and keep it on screen
+        env = dict(os.environ)
+        env.setdefault('LESS', 'FRX')
+        try:
+            process = subprocess.Popen(self._pager_command(), stdin=subprocess.PIPE, env=env, text=True, encoding='utf-8', errors='replace')
+        except OSError as e:
+            logger.warning(f"Failed to start the pager, printing instead: {e}")
+            yield self.console
+            return
+
+        from rich.console import Console
+        pager_console = Console(
+            file=process.stdin,
+            force_terminal=True,
+            color_system=self.console.color_system,
+            width=self.console.width,
+        )
+        try:
+            yield pager_console
+        finally:
+            try:
+                process.stdin.close()
+            except BrokenPipeError:
+                pass
+            process.wait()
+
+    def render(self, formatter: MarkdownChatFormatter, tabs: Iterable[tuple[int, Tab]], image_dir: str | None = None) -> int:
+        """Render tabs bubble by bubble.
+
+        Args:
+            formatter (MarkdownChatFormatter): The formatter producing the Markdown of each bubble.
+            tabs (Iterable[tuple[int, Tab]]): The tab indices and tabs to render, decoded on demand.
+            image_dir (str | None): The directory where images will be saved. Images are skipped if None.
+
+        Returns:
+            int: The number of tabs rendered. Fewer than given if the pager was quit early.
+        """
+        from rich.markdown import Markdown
+
+        rendered = 0
+        try:
+            with self._open() as console:
+                for tab_index, tab in tabs:
+                    for chunk in formatter.iter_tab(tab_index, tab, image_dir):
+                        with profile_stage(self.profiler, "print") as measured:
+                            console.print(Markdown(chunk))
+                            console.file.flush()
+                            measured["bytes"] = len(chunk)
+                    rendered += 1
+        except BrokenPipeError:
+            # The pager was quit before the end of the transcript, nothing left to do
+            logger.debug(f"Pager closed after {rendered} tabs")
+        finally:
+            formatter.close()
+        return rendered
+
+def write_markdown(formatter: MarkdownChatFormatter, tabs: Iterable[tuple[int, Tab]], file: IO[str], image_dir: str | None = None, profiler: Profiler | None = None) -> int:
+    """Write the raw Markdown of tabs bubble by bubble, for output that is not read on a terminal.
+
+    Neither rich nor the Markdown parser are loaded, and each tab reads the same as its exported file.
+
+    Args:
+        formatter (MarkdownChatFormatter): The formatter producing the Markdown of each bubble.
+        tabs (Iterable[tuple[int, Tab]]): The tab indices and tabs to write, decoded on demand.
+        file (IO[str]): The file to write to, usually the standard output.
+        image_dir (str | None): The directory where images will be saved. Images are skipped if None.
+        profiler (Profiler | None): The profiler recording the time spent writing.
+
+    Returns:
+        int: The number of tabs written. Fewer than given if the reading end of a pipe was closed early.
+    """
+    written = 0
+    try:
+        for tab_index, tab in tabs:
+            if written:
+                file.write("\n")
+            for chunk in formatter.iter_tab(tab_index, tab, image_dir):
+                with profile_stage(profiler, "print") as measured:
+                    file.write(chunk)
+                    file.write("\n")
+                    measured["bytes"] = len(chunk)
+            file.flush()
+            written += 1
+    except BrokenPipeError:
+        # The reader is gone; point the file at /dev/null so flushing it at exit does not fail again
+        logger.debug(f"Output closed after {written} tabs")
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, file.fileno())
+        os.close(devnull)
+    finally:
+        formatter.close()
+    return written
@@ -0,0 +1,162 @@
+import re
+import json
+from typing import Any, Iterator
+from loguru import logger
+from src.vscdb import VSCDBQuery
+from src.chatdata import iter_tabs
+from src.model import Tab
+from src.pool import pool_map
+
+SNIPPET_CONTEXT = 60
+
+class ChatMatcher:
+    def __init__(self, queries: list[str], regex: bool = False, case_sensitive: bool = False, context: int = SNIPPET_CONTEXT, hits_per_tab: int = 1) -> None:
+        """
+        Initialize the ChatMatcher, which finds many queries at once in the raw text of the bubbles.
+
+        The queries are compiled once. Plain texts are also joined into a single alternation, which
+        rejects the bubbles matching none of them in one scan; only the bubbles it accepts are searched
+        query by query. Regular expressions are not joined, since their flags, group names and
+        backreferences only hold on their own. A tab stops being scanned as soon as every query was found in it `hits_per_tab` times.
+
+        Plain queries that are printable ASCII without quotes or backslashes look the same in the raw
+        JSON as in the decoded text, so for them a database whose raw value matches none is not decoded at all.
+
+        Args:
+            queries (list[str]): The texts, or regular expressions, to search for.
+            regex (bool): Treat the queries as regular expressions instead of plain texts.
+            case_sensitive (bool): Match the case of the queries.
+            context (int): The number of characters shown before and after each match.
+            hits_per_tab (int): The number of hits reported per query and tab. 0 reports every hit.
+
+        Raises:
+            ValueError: If there are no queries or a regular expression is invalid.
+        """
+        if not queries:
+            raise ValueError("No queries to search for")
+        self.queries = list(queries)
+        self.context = context
+        self.hits_per_tab = hits_per_tab
+
+        flags = 0 if case_sensitive else re.IGNORECASE
+        sources = [query if regex else re.escape(query) for query in self.queries]
+        try:
+            self._patterns = [re.compile(source, flags) for source in sources]
+            self._any = None if regex else re.compile("|".join(sources), flags)
+        except re.error as e:
+            raise ValueError(f"Invalid regular expression: {e}") from e
+
+        # Escapes in the JSON could hide a regular expression or a plain text with quotes or control characters
+        literal = not regex and all(query.isascii() and query.isprintable() and '"' not in query and '\\' not in query for query in self.queries)
+        self._raw_filter = self._any if literal else None
+
+    def may_match(self, chat_data: str | bytes) -> bool:
+        """Check whether the raw chat data of a database can contain a hit, without decoding it."""
+        if self._raw_filter is None:
+            return True
+        if isinstance(chat_data, bytes):
+            chat_data = chat_data.decode('utf-8', errors='replace')
+        return self._raw_filter.search(chat_data) is not None
+
+    def _may_match_text(self, text: str) -> bool:
+        if self._any is not None:
+            return self._any.search(text) is not None
+        return any(pattern.search(text) for pattern in self._patterns)
+
+    def _snippet(self, text: str, start: int, end: int) -> str:
+        snippet_start = max(0, start - self.context)
+        snippet_end = min(len(text), end + self.context)
+        snippet = " ".join(text[snippet_start:snippet_end].split())
+        return f"{'…' if snippet_start > 0 else ''}{snippet}{'…' if snippet_end < len(text) else ''}"
+
+    def match_tab(self, tab_index: int, tab: Tab) -> list[dict[str, Any]]:
+        """Find the queries in the text and selections of the bubbles of a tab.
+
+        Args:
+            tab_index (int): The index of the tab.
+            tab (Tab): The tab to search.
+
+        Returns:
+            list[dict[str, Any]]: The query, tab and bubble numbers (from 1), role, position and snippet of each hit, in bubble order.
+        """
+        hits = []
+        counts = [0] * len(self._patterns)
+        remaining = len(self._patterns) if self.hits_per_tab else -1
+        for bubble_index, bubble in enumerate(tab.bubbles):
+            if bubble.role == 'user':
+                texts = (*bubble.selections, bubble.text)
+            elif bubble.role == 'ai':
+                texts = (bubble.text,)
+            else:
+                continue
+            for text in texts:
+                if not text or not self._may_match_text(text):
+                    continue
+                for query_index, pattern in enumerate(self._patterns):
+                    if self.hits_per_tab and counts[query_index] >= self.hits_per_tab:
+                        continue
+                    for match in pattern.finditer(text):
+                        # Empty matches of a regular expression say nothing
+                        if match.start() == match.end():
+                            continue
+                        hits.append({
+                            "query": self.queries[query_index],
+                            "tab": tab_index + 1,
+                            "bubble": bubble_index + 1,
+                            "role": bubble.role,
+                            "start": match.start(),
+                            "snippet": self._snippet(text, match.start(), match.end()),
+                        })
+                        counts[query_index] += 1
+                        if self.hits_per_tab and counts[query_index] >= self.hits_per_tab:
+                            remaining -= 1
+                            break
+                if remaining == 0:
+                    return hits
+        return hits
+
+def search_db(db_path: str, matcher: ChatMatcher) -> list[dict[str, Any]]:
+    """Query and decode the chats of a single database and find the queries of a matcher.
+
+    This is a module-level function so it can be shipped to worker processes.
+
+    Args:
+        db_path (str): The path to the state.vscdb file.
+        matcher (ChatMatcher): The compiled queries.
+
+    Returns:
+        list[dict[str, Any]]: The hits, in tab and bubble order.
+    """
+    chat_data = VSCDBQuery(db_path).query_aichat_data()
+
+    if "error" in chat_data:
+        logger.error(f"Error querying chat data from {db_path}: {chat_data['error']}")
+        return []
+    if not chat_data:
+        logger.debug(f"No chat data found in {db_path}")
+        return []
+    if not matcher.may_match(chat_data[0]):
+        logger.debug(f"No query found in the raw chat data of {db_path}")
+        return []
+
+    hits = []
+    try:
+        for tab_index, tab in iter_tabs(chat_data[0]):
+            hits.extend(matcher.match_tab(tab_index, tab))
+    except json.JSONDecodeError as e:
+        logger.error(f"JSON decode error in {db_path}: {e}")
+        return []
+    return hits
+
+def search_dbs(db_paths: list[str], matcher: ChatMatcher, jobs: int = 1) -> Iterator[tuple[str, list[dict[str, Any]]]]:
+    """Run `search_db` over several databases, optionally on a process pool, in the order of `db_paths`.
+
+    Args:
+        db_paths (list[str]): The paths to the state.vscdb files.
+        matcher (ChatMatcher): The compiled queries.
+        jobs (int): The number of worker processes. 1 runs everything in this process.
+
+    Yields:
+        tuple[str, list[dict[str, Any]]]: The database path and its hits.
+    """
+    yield from pool_map(search_db, db_paths, matcher, jobs=jobs)
@@ -0,0 +1,327 @@
+import os
+import sys
+import json
+import stat
+import signal
+import socket
+import threading
+import socketserver
+from collections import OrderedDict
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+from urllib.parse import parse_qs, unquote, urlsplit
+from loguru import logger
+from src.catalog import WorkspaceCatalog
+from src.chatdata import iter_tabs
+from src.discover import PREVIEW_LINES
+from src.export import MarkdownChatFormatter
+from src.model import Tab
+from src.vscdb import VSCDBQuery
+
+class CachedChats:
+    __slots__ = ('version', 'tabs', 'markdown', 'size')
+
+    def __init__(self, version: tuple[int, int], tabs: list[Tab], size: int) -> None:
+        """The decoded tabs of a database, and the Markdown of the tabs formatted so far."""
+        self.version = version
+        self.tabs = tabs
+        self.markdown: dict[int, str] = {}
+        self.size = size
+
+class ChatService:
+    def __init__(self, catalog: WorkspaceCatalog, cache_bytes: int = 256 << 20) -> None:
+        """
+        Initialize the ChatService, which answers queries about the chats of a workspace storage directory.
+
+        Decoded chats are kept in an LRU cache, so repeated queries neither hit SQLite nor decode or format
+        the same chats again. An entry is dropped as soon as the modification time or size of its database
+        changes. The cache is bounded by the size of the raw chat data plus the Markdown formatted from it,
+        which is a proxy for, not a measure of, the memory the decoded chats take.
+
+        The methods may be called from several threads at once.
+
+        Args:
+            catalog (WorkspaceCatalog): The catalog of the workspace storage directory.
+            cache_bytes (int): The size the cached chats may add up to.
+        """
+        self.catalog = catalog
+        self.cache_bytes = cache_bytes
+        self.formatter = MarkdownChatFormatter()
+        self._catalog_lock = threading.Lock()
+        self._cache: OrderedDict[str, CachedChats] = OrderedDict()
+        self._cached_bytes = 0
+        self._cache_lock = threading.Lock()
+
+    def _workspace(self, workspace_id: str) -> dict[str, Any]:
+        with self._catalog_lock:
+            if workspace_id not in self.catalog.workspaces:
+                self.catalog.refresh()
+            workspace = self.catalog.workspaces.get(workspace_id)
+        if workspace is None:
+            raise LookupError(f"Unknown workspace: {workspace_id}")
+        return workspace
+
+    def _evict(self) -> None:
+        # Called with the cache lock held. The most recently used entry is kept even if it alone is too large.
+        while self._cached_bytes > self.cache_bytes and len(self._cache) > 1:
+            db_path, evicted = self._cache.popitem(last=False)
+            self._cached_bytes -= evicted.size
+            logger.debug(f"Evicted {db_path} from the chat cache")
+
+    def _load(self, db_path: str) -> CachedChats:
+        stat = os.stat(db_path)
+        version = (stat.st_mtime_ns, stat.st_size)
+        with self._cache_lock:
+            cached = self._cache.get(db_path)
+            if cached is not None and cached.version == version:
+                self._cache.move_to_end(db_path)
+                return cached
+
+        # Decoding happens outside the lock, so other databases can be served meanwhile
+        chat_data = VSCDBQuery(db_path).query_aichat_data()
+        if "error" in chat_data:
+            raise RuntimeError(f"Error querying chat data: {chat_data['error']}")
+        raw_value = chat_data[0] if chat_data else '{}'
+        cached = CachedChats(version, [tab for _, tab in iter_tabs(raw_value)], len(raw_value))
+
+        with self._cache_lock:
+            previous = self._cache.pop(db_path, None)
+            if previous is not None:
+                self._cached_bytes -= previous.size
+            self._cache[db_path] = cached
+            self._cached_bytes += cached.size
+            self._evict()
+        return cached
+
+    def _tab(self, cached: CachedChats, tab_number: int) -> Tab:
+        if not 1 <= tab_number <= len(cached.tabs):
+            raise LookupError(f"Unknown tab: {tab_number}")
+        return cached.tabs[tab_number - 1]
+
+    def cache_info(self) -> dict[str, int]:
+        """Return the number of cached databases and their size."""
+        with self._cache_lock:
+            return {"databases": len(self._cache), "bytes": self._cached_bytes, "max_bytes": self.cache_bytes}
+
+    def list_workspaces(self) -> list[dict[str, Any]]:
+        """List the workspaces, most recently used first."""
+        with self._catalog_lock:
+            self.catalog.refresh()
+            workspaces = sorted(self.catalog.workspaces.items(), key=lambda item: item[1]['folder_mtime'], reverse=True)
+        return [
+            {
+                "workspace": folder,
+                "project": workspace['project'],
+                "db_path": workspace['db_path'],
+                "tab_count": workspace['tab_count'],
+                "last_used": datetime.fromtimestamp(workspace['folder_mtime'], timezone.utc).isoformat(),
+            }
+            for folder, workspace in workspaces
+        ]
+
+    def list_tabs(self, workspace_id: str) -> list[dict[str, Any]]:
+        """List the tabs of a workspace, numbered from 1 like the `export --tab-ids` option."""
+        cached = self._load(self._workspace(workspace_id)['db_path'])
+        return [
+            {
+                "tab": tab_index + 1,
+                "title": tab.title,
+                "timestamp": tab.timestamp,
+                "bubbles": len(tab.bubbles),
+            }
+            for tab_index, tab in enumerate(cached.tabs)
+        ]
+
+    def get_tab(self, workspace_id: str, tab_number: int) -> dict[str, Any]:
+        """Return the title, timestamp and bubbles of a tab."""
+        cached = self._load(self._workspace(workspace_id)['db_path'])
+        return self._tab(cached, tab_number).to_dict()
+
+    def get_tab_markdown(self, workspace_id: str, tab_number: int) -> str:
+        """Return a tab formatted as Markdown, without images."""
+        db_path = self._workspace(workspace_id)['db_path']
+        cached = self._load(db_path)
+        markdown = cached.markdown.get(tab_number)
+        if markdown is None:
+            tab = self._tab(cached, tab_number)
+            markdown = "\n".join(self.formatter.iter_tab(tab_number - 1, tab, None))
+            with self._cache_lock:
+                if tab_number not in cached.markdown:
+                    cached.markdown[tab_number] = markdown
+                    cached.size += len(markdown)
+                    # The entry may have been evicted or replaced meanwhile, then it no longer counts
+                    if self._cache.get(db_path) is cached:
+                        self._cached_bytes += len(markdown)
+                        self._evict()
+        return markdown
+
+    def search(self, search_text: str, workspace_id: str | None = None, limit: int | None = None) -> list[dict[str, Any]]:
+        """Find the tabs containing a text (case-insensitive), most recently used workspaces first.
+
+        Args:
+            search_text (str): The text to search for.
+            workspace_id (str | None): Only search this workspace.
+            limit (int | None): The maximum number of tabs to return.
+
+        Returns:
+            list[dict[str, Any]]: The workspace, tab number and preview of each matching tab.
+        """
+        if workspace_id is not None:
+            workspaces = [{"workspace": workspace_id, **self._workspace(workspace_id)}]
+        else:
+            workspaces = self.list_workspaces()
+
+        hits = []
+        for workspace in workspaces:
+            try:
+                cached = self._load(workspace['db_path'])
+            except (OSError, RuntimeError) as e:
+                logger.error(f"Skipping {workspace['db_path']} in search: {e}")
+                continue
+            for tab_index, tab in enumerate(cached.tabs):
+                preview = self.formatter.preview(tab_index, tab, max_lines=PREVIEW_LINES, search_text=search_text)
+                if preview is None:
+                    continue
+                hits.append({"workspace": workspace['workspace'], "project": workspace['project'], "tab": tab_index + 1, "preview": preview})
+                if limit is not None and len(hits) >= limit:
+                    return hits
+        return hits
+
+class ChatRequestHandler(BaseHTTPRequestHandler):
+    """Route the GET requests of the chat service.
+
+    GET /workspaces
+    GET /workspaces/<workspace>/tabs
+    GET /workspaces/<workspace>/tabs/<tab>?format=md|json
+    GET /search?q=<text>[&workspace=<workspace>][&limit=<n>]
+    GET /cache
+    """
+    server_version = "cursor-chat-export"
+
+    def _host_allowed(self) -> bool:
+        # A page of another site that rebinds its name to 127.0.0.1 still sends its own name as Host
+        if isinstance(self.server, UnixHTTPServer):
+            return True
+        host = self.headers.get('Host')
+        if not host:
+            return False
+        hostname = urlsplit(f"//{host}").hostname
+        return hostname in ('localhost', '127.0.0.1', '::1', self.server.server_address[0])
+
+    def do_GET(self) -> None:
+        service: ChatService = self.server.service
+        if not self._host_allowed():
+            self._send_json({"error": f"Host not allowed: {self.headers.get('Host')}"}, 403)
+            return
+        url = urlsplit(self.path)
+        parts = [unquote(part) for part in url.path.split('/') if part]
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+
+        try:
+            if parts == ['workspaces']:
+                self._send_json(service.list_workspaces())
+            elif len(parts) == 3 and parts[0] == 'workspaces' and parts[2] == 'tabs':
+                self._send_json(service.list_tabs(parts[1]))
+            elif len(parts) == 4 and parts[0] == 'workspaces' and parts[2] == 'tabs':
+                tab_number = self._int(parts[3], "tab")
+                output_format = query.get('format', 'md')
+                if output_format == 'md':
+                    self._send(200, 'text/markdown; charset=utf-8', service.get_tab_markdown(parts[1], tab_number))
+                elif output_format == 'json':
+                    self._send_json(service.get_tab(parts[1], tab_number))
+                else:
+                    raise ValueError(f"Unknown format: {output_format}. Expected md or json")
+            elif parts == ['search']:
+                if not query.get('q'):
+                    raise ValueError("Missing search text: q")
+                limit = self._int(query['limit'], "limit") if 'limit' in query else None
+                self._send_json(service.search(query['q'], query.get('workspace'), limit))
+            elif parts == ['cache']:
+                self._send_json(service.cache_info())
+            else:
+                self._send_json({"error": f"Not found: {url.path}"}, 404)
+        except LookupError as e:
+            self._send_json({"error": str(e)}, 404)
+        except ValueError as e:
+            self._send_json({"error": str(e)}, 400)
+        except Exception as e:
+            logger.exception(f"Failed to answer {self.path}")
+            self._send_json({"error": str(e)}, 500)
+
+    @staticmethod
+    def _int(value: str, name: str) -> int:
+        try:
+            return int(value)
+        except ValueError:
+            raise ValueError(f"Expected a number for {name}: {value}") from None
+
+    def _send(self, status: int, content_type: str, body: str) -> None:
+        data = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_json(self, value: Any, status: int = 200) -> None:
+        self._send(status, 'application/json', json.dumps(value))
+
+    def log_message(self, format: str, *args: Any) -> None:
+        logger.debug(f"{self.address_string()} {format % args}")
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self) -> tuple[socket.socket, tuple[str, int]]:
+        # Unix sockets have no peer address, give the handler one it can log
+        request, _ = super().get_request()
+        return request, ('unix', 0)
+
+def _remove_socket(socket_path: str) -> None:
+    """Remove a stale unix socket, refusing to remove anything that is not a socket."""
+    try:
+        mode = os.lstat(socket_path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise FileExistsError(f"Not a socket, refusing to replace it: {socket_path}")
+    os.remove(socket_path)
+
+def run_server(service: ChatService, host: str = '127.0.0.1', port: int = 8765, socket_path: str | None = None) -> None:
+    """Serve the chat service over HTTP until interrupted, one thread per connection.
+
+    Args:
+        service (ChatService): The service answering the requests.
+        host (str): The address to listen on.
+        port (int): The port to listen on.
+        socket_path (str | None): Listen on this unix socket instead of a TCP port.
+    """
+    if socket_path:
+        _remove_socket(socket_path)
+        # Only the user may connect, like to their chat history files
+        previous_umask = os.umask(0o177)
+        try:
+            server = UnixHTTPServer(socket_path, ChatRequestHandler)
+        finally:
+            os.umask(previous_umask)
+        os.chmod(socket_path, 0o600)
+        address = f"unix:{socket_path}"
+    else:
+        server = ThreadingHTTPServer((host, port), ChatRequestHandler)
+        address = f"http://{host}:{server.server_port}"
+    server.service = service
+
+    # Stop like on Ctrl+C when terminated, so the unix socket gets removed
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+
+    logger.info(f"Serving chats on {address}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if socket_path:
+            _remove_socket(socket_path)
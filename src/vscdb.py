@@ -1,40 +1,214 @@
 import os
+import time
+import shutil
 import sqlite3
-import yaml
+import tempfile
 from typing import Any
 from loguru import logger
+from src.config import load_config
+from src.profiling import Profiler, profile_stage
+
+# Primary result codes of a database another connection is writing to
+SQLITE_BUSY = 5
+SQLITE_LOCKED = 6
+SQLITE_CANTOPEN = 14
+
+READ_FALLBACKS = ('auto', 'immutable', 'snapshot', 'none')
+
+# The files of a database, all copied by a snapshot: the database, its rollback journal and its write-ahead log
+DB_SUFFIXES = ('', '-journal', '-wal')
+
+def db_version(db_path: str) -> tuple[int, ...] | None:
+    """Return the modification times and sizes of a database, its rollback journal and its write-ahead log, or None if there is no database.
+
+    Writes that only reached the write-ahead log change the version too, although the database itself looks untouched.
+    """
+    version = []
+    for suffix in DB_SUFFIXES:
+        try:
+            stat = os.stat(f'{db_path}{suffix}')
+        except OSError:
+            if not suffix:
+                return None
+            version.extend((0, 0))
+            continue
+        version.extend((stat.st_mtime_ns, stat.st_size))
+    return tuple(version)
 
 class VSCDBQuery:
-    def __init__(self, db_path: str) -> None:
+    def __init__(
+        self,
+        db_path: str,
+        profiler: Profiler | None = None,
+        busy_timeout: float | None = None,
+        retries: int | None = None,
+        backoff: float | None = None,
+        fallback: str | None = None,
+    ) -> None:
         """
         Initialize the VSCDBQuery with the path to the SQLite database.
 
+        Cursor keeps writing to the database of an open workspace. A read first waits up to `busy_timeout`
+        for the writer, and is retried with an exponential backoff while the database stays locked. If it
+        is still locked after that, the fallback reads it without taking any lock: `immutable` opens it with
+        `immutable=1`, `snapshot` copies it, with its journal or write-ahead log, to a temporary folder and
+        reads the copy, copying again while the files change during the copy. `auto` picks `snapshot` if there is a write-ahead log, whose changes an immutable
+        read would miss, else `immutable`. The strategy that succeeded is kept in `read_strategy`.
+
+        The options not given are taken from the `read_*` entries of the config.
+
         Args:
             db_path (str): The path to the SQLite database file.
+            profiler (Profiler | None): The profiler recording the time spent loading the config and querying.
+            busy_timeout (float | None): The number of seconds a read waits for a writer to finish.
+            retries (int | None): The number of times a locked read is retried.
+            backoff (float | None): The number of seconds to wait before the first retry, doubled for each further one.
+            fallback (str | None): What to do if the database stays locked: 'auto', 'immutable', 'snapshot' or 'none'.
         """
         self.db_path = db_path
-        logger.info(f"Database path: {os.path.join(os.path.basename(os.path.dirname(self.db_path)), os.path.basename(self.db_path))}")
+        self.profiler = profiler
+        self.busy_timeout = busy_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.fallback = fallback
+        self.read_strategy: str | None = None
+        logger.info(f"Database path: {self._name()}")
+
+    def _name(self) -> str:
+        return os.path.join(os.path.basename(os.path.dirname(self.db_path)), os.path.basename(self.db_path))
+
+    def _read_options(self) -> tuple[float, int, float, str]:
+        try:
+            config = load_config()
+        except (FileNotFoundError, ValueError):
+            config = {}
+        busy_timeout = self.busy_timeout if self.busy_timeout is not None else config.get('read_busy_timeout_ms', 250) / 1000
+        retries = self.retries if self.retries is not None else config.get('read_retries', 3)
+        backoff = self.backoff if self.backoff is not None else config.get('read_backoff_ms', 100) / 1000
+        fallback = self.fallback or config.get('read_fallback', 'auto')
+        if fallback not in READ_FALLBACKS:
+            raise ValueError(f"Unknown read fallback: {fallback}. Expected one of {', '.join(READ_FALLBACKS)}")
+        return busy_timeout, retries, backoff, fallback
+
+    @staticmethod
+    def _error_code(error: sqlite3.Error) -> int | None:
+        code = getattr(error, 'sqlite_errorcode', None)
+        if code is not None:
+            return code & 0xff
+        message = str(error).lower()
+        if 'locked' in message or 'busy' in message:
+            return SQLITE_BUSY
+        return None
+
+    @staticmethod
+    def _execute(uri: str, query: str, parameters: tuple[Any, ...], timeout: float) -> list[Any]:
+        conn = sqlite3.connect(uri, uri=True, timeout=timeout)
+        try:
+            rows = conn.execute(query, parameters).fetchall()
+        finally:
+            conn.close()
+
+        # Assuming the query returns rows with a single column
+        return [row[0] for row in rows]
+
+    def _read(self, query: str, parameters: tuple[Any, ...]) -> list[Any]:
+        busy_timeout, retries, backoff, fallback = self._read_options()
+        uri = f'file:{self.db_path}?mode=ro'
+        has_wal = os.path.exists(f'{self.db_path}-wal')
+
+        error = None
+        for attempt in range(retries + 1):
+            try:
+                result = self._execute(uri, query, parameters, busy_timeout)
+                self.read_strategy = 'direct' if attempt == 0 else 'retry'
+                return result
+            except sqlite3.OperationalError as e:
+                error = e
+                code = self._error_code(e)
+                # A read-only connection cannot create the shared memory file of a write-ahead log, don't retry
+                if code == SQLITE_CANTOPEN and has_wal:
+                    break
+                if code not in (SQLITE_BUSY, SQLITE_LOCKED):
+                    raise
+            if attempt < retries:
+                delay = backoff * 2 ** attempt
+                logger.debug(f"{self._name()} is locked, retrying in {delay:.2f} s")
+                with profile_stage(self.profiler, "query.wait", self.db_path):
+                    time.sleep(delay)
+
+        if fallback == 'auto':
+            fallback = 'snapshot' if has_wal else 'immutable'
+        if fallback == 'immutable':
+            result = self._execute(f'{uri}&immutable=1', query, parameters, busy_timeout)
+        elif fallback == 'snapshot':
+            result = self._read_snapshot(query, parameters, busy_timeout, retries, backoff)
+        else:
+            raise error
+        self.read_strategy = fallback
+        return result
+
+    def _file_versions(self) -> list[tuple[int, int, int] | None]:
+        versions = []
+        for suffix in DB_SUFFIXES:
+            try:
+                stat = os.stat(f'{self.db_path}{suffix}')
+                versions.append((stat.st_ino, stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                versions.append(None)
+        return versions
 
-    def query_to_json(self, query: str) -> list[Any] | dict[str, str]:
+    def _read_snapshot(self, query: str, parameters: tuple[Any, ...], timeout: float, retries: int, backoff: float) -> list[Any]:
+        for attempt in range(retries + 1):
+            with tempfile.TemporaryDirectory(prefix='cursor-chat-export-') as snapshot_dir:
+                snapshot_path = os.path.join(snapshot_dir, os.path.basename(self.db_path))
+                with profile_stage(self.profiler, "query.snapshot", self.db_path) as measured:
+                    # The files are copied one after the other without a lock, so a commit finishing in between
+                    # would leave the copies out of step. The copy is only used if none of the files changed
+                    # while copying, and if the copy passes an integrity check after replaying the journal or
+                    # write-ahead log copied along.
+                    before = self._file_versions()
+                    for suffix in DB_SUFFIXES:
+                        try:
+                            shutil.copyfile(f'{self.db_path}{suffix}', f'{snapshot_path}{suffix}')
+                            measured["bytes"] += os.path.getsize(f'{snapshot_path}{suffix}')
+                        except FileNotFoundError:
+                            if not suffix:
+                                raise
+                    unchanged = before == self._file_versions()
+
+                if unchanged:
+                    conn = sqlite3.connect(f'file:{snapshot_path}', uri=True, timeout=timeout)
+                    try:
+                        if conn.execute("PRAGMA quick_check").fetchone()[0] == 'ok':
+                            return [row[0] for row in conn.execute(query, parameters).fetchall()]
+                    except sqlite3.DatabaseError as e:
+                        logger.debug(f"Snapshot of {self._name()} is unreadable: {e}")
+                    finally:
+                        conn.close()
+            if attempt < retries:
+                delay = backoff * 2 ** attempt
+                logger.debug(f"{self._name()} changed while it was copied, retrying in {delay:.2f} s")
+                with profile_stage(self.profiler, "query.wait", self.db_path):
+                    time.sleep(delay)
+        raise sqlite3.OperationalError(f"{self._name()} kept changing while it was copied")
+
+    def query_to_json(self, query: str, parameters: tuple[Any, ...] = ()) -> list[Any] | dict[str, str]:
         """
         Execute a SQL query and return the results as a JSON-compatible list.
 
         Args:
             query (str): The SQL query to execute.
+            parameters (tuple[Any, ...]): The values bound to the placeholders of the query.
 
         Returns:
             list[Any] | dict[str, str]: The query results as a list, or an error message as a dictionary.
         """
         try:
             logger.debug(f"Executing query: {query}")
-            conn = sqlite3.connect(f'file:{self.db_path}?mode=ro', uri=True)
-            cursor = conn.cursor()
-            cursor.execute(query)
-            rows = cursor.fetchall()
-            conn.close()
-
-            # Assuming the query returns rows with a single column
-            result = [row[0] for row in rows]
+            with profile_stage(self.profiler, "query", self.db_path) as measured:
+                result = self._read(query, parameters)
+                measured["bytes"] = sum(len(value) for value in result if isinstance(value, (str, bytes)))
+            logger.info(f"Read {self._name()} using the {self.read_strategy} strategy")
             logger.success(f"Query executed successfully, fetched {len(result)} rows.")
             return result
         except sqlite3.Error as e:
@@ -44,24 +218,59 @@ class VSCDBQuery:
             logger.error(f"Unexpected error: {e}")
             return {"error": str(e)}
         
-    def query_aichat_data(self) -> list[Any] | dict[str, str]:
+    def query_aichat_data(self, search_text: str | None = None) -> list[Any] | dict[str, str]:
         """
         Query the AI chat data from the database.
 
+        Args:
+            search_text (str | None): Only fetch the chat data if its raw value contains this text (ASCII case-insensitive).
+                The check runs inside SQLite, so non-matching values are never loaded.
+
         Returns:
             list[Any] | dict[str, str]: The AI chat data as a list, or an error message as a dictionary.
+                The list is empty if the chat data does not contain the search text.
+        """
+        try:
+            with profile_stage(self.profiler, "config", self.db_path):
+                config = load_config()
+            if search_text is None:
+                query = config['aichat_query']
+                logger.debug("Loaded AI chat query from config.yaml")
+                return self.query_to_json(query)
+            query = config['aichat_search_query']
+            logger.debug("Loaded AI chat search query from config.yaml")
+            return self.query_to_json(query, (search_text.lower(),))
+        except FileNotFoundError as e:
+            logger.error(f"Config file not found: {e}")
+            return {"error": str(e)}
+        except ValueError as e:
+            logger.error(str(e))
+            return {"error": str(e)}
+        except Exception as e:
+            logger.error(f"Unexpected error: {e}")
+            return {"error": str(e)}
+
+    def query_aichat_tab_count(self) -> int | dict[str, str]:
+        """
+        Count the AI chat tabs without decoding the chat data in Python.
+
+        Returns:
+            int | dict[str, str]: The number of tabs, or an error message as a dictionary.
         """
         try:
-            with open('config.yml', 'r') as config_file:
-                config = yaml.safe_load(config_file)
-            query = config['aichat_query']
-            logger.debug("Loaded AI chat query from config.yaml")
-            return self.query_to_json(query)
+            with profile_stage(self.profiler, "config", self.db_path):
+                config = load_config()
+            query = config['aichat_tab_count_query']
+            logger.debug("Loaded AI chat tab count query from config.yaml")
+            result = self.query_to_json(query)
+            if "error" in result:
+                return result
+            return (result[0] or 0) if result else 0
         except FileNotFoundError as e:
             logger.error(f"Config file not found: {e}")
             return {"error": str(e)}
-        except yaml.YAMLError as e:
-            logger.error(f"Error parsing config file: {e}")
+        except ValueError as e:
+            logger.error(str(e))
             return {"error": str(e)}
         except Exception as e:
             logger.error(f"Unexpected error: {e}")
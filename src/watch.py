@@ -0,0 +1,305 @@
+import os
+import sys
+import time
+import errno
+import select
+import signal
+import struct
+import threading
+from loguru import logger
+from src.catalog import WorkspaceCatalog
+from src.chatdata import iter_tabs
+from src.export import ChatExporter, ExportManifest, MarkdownChatFormatter, MarkdownFileSaver
+from src.vscdb import VSCDBQuery, db_version
+
+# Cursor writes to the database itself, or to its write-ahead log or rollback journal first
+DB_FILES = ('state.vscdb', 'state.vscdb-wal', 'state.vscdb-journal')
+
+class PollingWatcher:
+    def __init__(self, storage_dir: str, interval: float = 5.0) -> None:
+        """
+        Initialize the PollingWatcher, which finds the workspaces whose database changed by comparing their versions.
+
+        Each scan costs one `stat` per workspace and database file; only the last version of each workspace is kept.
+
+        Args:
+            storage_dir (str): The workspace storage directory, holding one folder per workspace.
+            interval (float): The number of seconds between two scans.
+        """
+        self.storage_dir = storage_dir
+        self.interval = interval
+        self._versions = self._scan()
+
+    def _scan(self) -> dict[str, tuple[int, ...]]:
+        versions = {}
+        with os.scandir(self.storage_dir) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    version = db_version(os.path.join(entry.path, DB_FILES[0]))
+                    if version is not None:
+                        versions[entry.name] = version
+        return versions
+
+    def wait(self, timeout: float | None = None) -> set[str]:
+        """Wait for the next scan and return the workspace folders whose database changed, appeared or disappeared."""
+        time.sleep(self.interval if timeout is None else max(0.0, min(self.interval, timeout)))
+        versions = self._scan()
+        changed = {folder for folder, version in versions.items() if self._versions.get(folder) != version}
+        changed.update(set(self._versions) - set(versions))
+        self._versions = versions
+        return changed
+
+    def close(self) -> None:
+        pass
+
+class InotifyWatcher:
+    # From <sys/inotify.h>
+    IN_MODIFY = 0x00000002
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ONLYDIR = 0x01000000
+    IN_ISDIR = 0x40000000
+
+    EVENT = struct.Struct('iIII')
+    BUFFER_SIZE = 64 * 1024
+
+    def __init__(self, storage_dir: str) -> None:
+        """
+        Initialize the InotifyWatcher, which lets the Linux kernel report the writes to the workspace databases.
+
+        The storage directory is watched for new workspace folders, and each workspace folder for writes to its
+        database files. Nothing runs between two writes, and events are read into a fixed-size buffer.
+
+        Args:
+            storage_dir (str): The workspace storage directory, holding one folder per workspace.
+
+        Raises:
+            OSError: If inotify is not available or the watch limit (fs.inotify.max_user_watches) is reached.
+        """
+        import ctypes
+        import ctypes.util
+
+        self.storage_dir = storage_dir
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, f"inotify_init1 failed: {os.strerror(error)}")
+        self._folders: dict[int, str | None] = {}
+        try:
+            self._add_watch(storage_dir, self.IN_CREATE | self.IN_MOVED_TO | self.IN_DELETE | self.IN_ONLYDIR, None)
+            with os.scandir(storage_dir) as entries:
+                for entry in entries:
+                    if entry.is_dir():
+                        self._watch_workspace(entry.name)
+        except OSError:
+            self.close()
+            raise
+
+    def _add_watch(self, path: str, mask: int, folder: str | None) -> None:
+        import ctypes
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), mask)
+        if wd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, f"inotify_add_watch failed for {path}: {os.strerror(error)}")
+        self._folders[wd] = folder
+
+    def _watch_workspace(self, folder: str) -> None:
+        mask = self.IN_MODIFY | self.IN_CLOSE_WRITE | self.IN_MOVED_TO | self.IN_CREATE | self.IN_DELETE | self.IN_ONLYDIR
+        try:
+            self._add_watch(os.path.join(self.storage_dir, folder), mask, folder)
+        except OSError as e:
+            # The folder may have been removed again meanwhile
+            if e.errno != errno.ENOENT:
+                raise
+
+    def wait(self, timeout: float | None = None) -> set[str]:
+        """Wait for writes, and return the workspace folders whose database changed, appeared or disappeared.
+
+        Returns an empty set if nothing was written before the timeout.
+        """
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return set()
+        try:
+            data = os.read(self._fd, self.BUFFER_SIZE)
+        except BlockingIOError:
+            return set()
+
+        changed = set()
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, name_length = self.EVENT.unpack_from(data, offset)
+            name = os.fsdecode(data[offset + self.EVENT.size:offset + self.EVENT.size + name_length].rstrip(b'\0'))
+            offset += self.EVENT.size + name_length
+
+            if mask & self.IN_Q_OVERFLOW:
+                # Events were dropped, every workspace may have changed
+                logger.warning("inotify queue overflowed, checking all workspaces")
+                changed.update(folder for folder in self._folders.values() if folder is not None)
+                continue
+            if mask & self.IN_IGNORED:
+                self._folders.pop(wd, None)
+                continue
+            folder = self._folders.get(wd)
+            if folder is None:
+                # An event of the storage directory itself
+                if mask & self.IN_ISDIR and mask & (self.IN_CREATE | self.IN_MOVED_TO):
+                    self._watch_workspace(name)
+                    changed.add(name)
+                elif mask & self.IN_ISDIR and mask & self.IN_DELETE:
+                    changed.add(name)
+            elif name in DB_FILES:
+                changed.add(folder)
+        return changed
+
+    def close(self) -> None:
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+def create_watcher(storage_dir: str, polling: bool = False, poll_interval: float = 5.0) -> InotifyWatcher | PollingWatcher:
+    """Watch a workspace storage directory with inotify on Linux, else by polling.
+
+    Args:
+        storage_dir (str): The workspace storage directory.
+        polling (bool): Poll even if inotify is available, e.g. on network file systems that do not report changes.
+        poll_interval (float): The number of seconds between two scans when polling.
+
+    Returns:
+        InotifyWatcher | PollingWatcher: The watcher.
+    """
+    if not polling and sys.platform.startswith('linux'):
+        try:
+            watcher = InotifyWatcher(storage_dir)
+            logger.info(f"Watching {storage_dir} with inotify")
+            return watcher
+        except OSError as e:
+            logger.warning(f"Falling back to polling: {e}")
+    logger.info(f"Watching {storage_dir} by polling every {poll_interval} seconds")
+    return PollingWatcher(storage_dir, poll_interval)
+
+class ChatWatcher:
+    def __init__(self, storage_dir: str, output_dir: str, debounce: float = 2.0, max_delay: float = 30.0, polling: bool = False, poll_interval: float = 5.0) -> None:
+        """
+        Initialize the ChatWatcher, which keeps the Markdown export of every workspace current while Cursor writes to it.
+
+        Each workspace is exported to its own folder of the output directory, named like in `export-archive`.
+        A workspace is exported once no write reached its database for `debounce` seconds, or at the latest
+        `max_delay` seconds after the first write of a burst. The export manifest of its folder limits the
+        export to the tabs that changed.
+
+        Nothing is kept between two exports but the version of each database, so memory does not grow with the uptime.
+
+        Args:
+            storage_dir (str): The workspace storage directory.
+            output_dir (str): The directory the workspace folders are exported to.
+            debounce (float): The number of quiet seconds to wait for before exporting.
+            max_delay (float): The maximum number of seconds an export is put off while writes keep coming.
+            polling (bool): Poll even if inotify is available.
+            poll_interval (float): The number of seconds between two scans when polling.
+        """
+        self.storage_dir = storage_dir
+        self.output_dir = output_dir
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.polling = polling
+        self.poll_interval = poll_interval
+        self._exported: dict[str, tuple[int, ...]] = {}
+
+    def export_workspace(self, folder: str) -> dict[str, int] | None:
+        """Export the changed tabs of a workspace.
+
+        Args:
+            folder (str): The workspace folder within the storage directory.
+
+        Returns:
+            dict[str, int] | None: The number of 'skipped', 'rewritten', 'added' and 'failed' tabs, or None if nothing was exported.
+        """
+        workspace_dir = os.path.join(self.storage_dir, folder)
+        db_path = os.path.join(workspace_dir, DB_FILES[0])
+        version = db_version(db_path)
+        if version is None:
+            self._exported.pop(folder, None)
+            return None
+        if self._exported.get(folder) == version:
+            return None
+
+        chat_data = VSCDBQuery(db_path).query_aichat_data()
+        if "error" in chat_data:
+            # Not recorded as exported, so the next write tries again
+            logger.error(f"Error querying chat data from {db_path}: {chat_data['error']}")
+            return None
+        if not chat_data:
+            self._exported[folder] = version
+            return None
+
+        output_dir = os.path.join(self.output_dir, WorkspaceCatalog.export_name(workspace_dir))
+        manifest = ExportManifest(output_dir)
+        # A new formatter per export, so the image names it remembers do not pile up over days
+        exporter = ChatExporter(MarkdownChatFormatter(), MarkdownFileSaver())
+        stats = exporter.export(iter_tabs(chat_data[0]), output_dir, os.path.join(output_dir, 'images'), manifest=manifest)
+        # Failed tabs keep no hash and the version stays unrecorded, so the next write exports them again
+        if not stats['failed']:
+            manifest.update_source(db_path, version, "all")
+        manifest.save()
+        if stats['failed']:
+            logger.error(f"Failed to export {stats['failed']} tabs of {folder} to {output_dir}")
+        else:
+            self._exported[folder] = version
+        logger.info(f"Exported {folder} to {output_dir}: {stats['skipped']} tabs skipped, {stats['rewritten']} rewritten, {stats['added']} added")
+        return stats
+
+    def export_all(self) -> None:
+        """Export the changed tabs of every workspace."""
+        with os.scandir(self.storage_dir) as entries:
+            folders = [entry.name for entry in entries if entry.is_dir()]
+        for folder in folders:
+            self._export_safely(folder)
+
+    def _export_safely(self, folder: str) -> None:
+        try:
+            self.export_workspace(folder)
+        except Exception as e:
+            logger.error(f"Failed to export {folder}: {e}")
+
+    def run(self, stop: threading.Event | None = None) -> None:
+        """Export every workspace once, then export the workspaces as they change until interrupted.
+
+        Args:
+            stop (threading.Event | None): Stop watching once set, checked at least every `debounce` seconds.
+        """
+        # Stop like on Ctrl+C when terminated
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+
+        watcher = create_watcher(self.storage_dir, self.polling, self.poll_interval)
+        # The first and last write of the bursts not exported yet, by workspace folder
+        pending: dict[str, tuple[float, float]] = {}
+        try:
+            self.export_all()
+            while stop is None or not stop.is_set():
+                now = time.monotonic()
+                if pending:
+                    due = min(min(first + self.max_delay, last + self.debounce) for first, last in pending.values())
+                    timeout = max(0.0, due - now)
+                else:
+                    timeout = self.debounce if stop is not None else None
+                changed = watcher.wait(timeout)
+
+                now = time.monotonic()
+                for folder in changed:
+                    first, _ = pending.get(folder, (now, now))
+                    pending[folder] = (first, now)
+                for folder, (first, last) in list(pending.items()):
+                    if now - last >= self.debounce or now - first >= self.max_delay:
+                        del pending[folder]
+                        self._export_safely(folder)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            watcher.close()